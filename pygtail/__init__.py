@@ -1,2 +1,11 @@
+import sys
+
+from pygtail.columns import ColumnBatch, JSONLinesExtractor, RegexExtractor
+from pygtail.compression import register_codec
 from pygtail.core import __version__
-from pygtail.core import Pygtail
+from pygtail.core import Pygtail, default_timestamp_parser, regex_timestamp_parser
+from pygtail.group import PygtailGroup
+from pygtail.offsets import FileOffsetStore, JournalOffsetStore, OffsetStore, SQLiteOffsetStore
+
+if sys.version_info >= (3, 6):
+    from pygtail.aio import AsyncPygtail
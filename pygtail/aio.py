@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""asyncio support for pygtail (Python 3.6+)."""
+
+import asyncio
+import collections
+import functools
+
+from pygtail.core import DEFAULT_BATCH_BYTES, Pygtail
+
+
+class AsyncPygtail(object):
+    """
+    Asynchronous version of `Pygtail`, for use with `async for`.
+
+    Iterating over an AsyncPygtail yields lines, and iterating over
+    `batches()` yields lists of lines. The file is read (and the offset file
+    written) in `executor` (default: the loop's default executor) a block of
+    `max_bytes` at a time, so the event loop never blocks on disk. With
+    `follow=True`, iteration waits for new lines at the end of the file; on
+    Linux the wait is on an inotify descriptor registered with the loop.
+
+    Other keyword arguments (offset_file, copytruncate, log_patterns,
+    full_lines, encoding, ...) are passed on to `Pygtail`.
+    """
+
+    def __init__(self, filename, follow=False, executor=None,
+                 max_bytes=DEFAULT_BATCH_BYTES, **kwargs):
+        self.filename = filename
+        self.follow = follow
+        self.executor = executor
+        self.max_bytes = max_bytes
+        self._kwargs = kwargs
+        self._tail = None
+        self._lines = collections.deque()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._lines:
+            lines = await self._next_block()
+            if lines is None:
+                raise StopAsyncIteration
+            self._lines.extend(lines)
+        return self._lines.popleft()
+
+    async def batches(self, max_lines=None):
+        """
+        Asynchronous generator yielding unread lines in lists, as
+        `Pygtail.read_batches()` does.
+        """
+        if self._lines:
+            lines, self._lines = list(self._lines), collections.deque()
+        else:
+            lines = await self._next_block()
+        while lines is not None:
+            if max_lines and len(lines) > max_lines:
+                for i in range(0, len(lines), max_lines):
+                    yield lines[i:i + max_lines]
+            else:
+                yield lines
+            lines = await self._next_block()
+
+    async def update_offset_file(self):
+        """Update the offset file with the current inode and offset."""
+        if self._tail is not None:
+            await self._run(self._tail.update_offset_file)
+
+    def close(self):
+        """Close the file being tailed and stop watching it."""
+        if self._tail is not None:
+            self._tail.close()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def _next_block(self):
+        """Return the next block of lines, or None at the end of the file."""
+        if self._tail is None:
+            # opening reads the offset file and looks for rotated logs
+            self._tail = await self._run(functools.partial(Pygtail, self.filename, **self._kwargs))
+        while True:
+            lines = await self._run(self._tail._next_block, self.max_bytes)
+            if lines is not None or not self.follow:
+                return lines
+            if not await self._run(self._tail._prepare_wait):
+                await self._wait_for_data()
+            self._tail._watcher.reset()
+
+    async def _wait_for_data(self):
+        watcher = self._tail._watcher
+        fd = watcher.fileno()
+        while True:
+            if fd is None:
+                await asyncio.sleep(watcher.next_interval())
+            else:
+                await self._wait_readable(fd, watcher.next_interval())
+                watcher.drain()
+            if await self._run(self._tail._check_for_data):
+                return
+
+    async def _wait_readable(self, fd, timeout):
+        loop = asyncio.get_event_loop()
+        ready = loop.create_future()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fd)
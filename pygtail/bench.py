@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Command-line benchmark runner: `python -m pygtail.bench [options] [case ...]`.
+"""
+
+import json
+import sys
+from optparse import OptionParser
+
+from pygtail.benchmarks import CASES, DEFAULT_SETTINGS, compare, run_benchmarks
+from pygtail.benchmarks.generate import DISTRIBUTIONS
+
+
+def _format_report(report):
+    rows = [("case", "lines/s", "MB/s", "syscalls", "peak RSS MiB", "seconds")]
+    for name, result in report['results'].items():
+        syscalls = None
+        if result['syscr'] is not None:
+            syscalls = result['syscr'] + result['syscw']
+        rows.append((
+            name,
+            "%.0f" % result['lines_per_sec'] if result['lines_per_sec'] else "-",
+            "%.1f" % result['mb_per_sec'] if result['mb_per_sec'] else "-",
+            "%d" % syscalls if syscalls is not None else "-",
+            "%.1f" % (result['peak_rss_bytes'] / 1048576.0) if result['peak_rss_bytes'] else "-",
+            "%.3f" % result['seconds'],
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join(
+        '  '.join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                  for i, (cell, width) in enumerate(zip(row, widths)))
+        for row in rows)
+
+
+def main(argv=None):
+    cmdline = OptionParser(usage="usage: %prog [options] [case ...]",
+        description="Benchmark pygtail on synthetic logs, reporting lines/s, MB/s,"
+                    " read/write syscalls and peak RSS for each case (default: all).")
+    cmdline.add_option("--size", action="store", type="float",
+        default=DEFAULT_SETTINGS['size'] / 1048576.0,
+        help="Size of the generated logs in MiB (default: %default).")
+    cmdline.add_option("--line-length", action="store", type="int",
+        default=DEFAULT_SETTINGS['line_length'],
+        help="Average line length in bytes (default: %default).")
+    cmdline.add_option("--distribution", action="store", type="choice", choices=DISTRIBUTIONS,
+        default=DEFAULT_SETTINGS['distribution'],
+        help="Line length distribution: %s (default: %%default)." % ', '.join(DISTRIBUTIONS))
+    cmdline.add_option("--seed", action="store", type="int", default=DEFAULT_SETTINGS['seed'],
+        help="Random seed for the generated logs (default: %default).")
+    cmdline.add_option("--every-n", action="store", type="int",
+        default=DEFAULT_SETTINGS['every_n'],
+        help="every_n for the every_n case (default: %default).")
+    cmdline.add_option("--checkpoint-lines", action="store", type="int",
+        default=DEFAULT_SETTINGS['checkpoint_lines'],
+        help="Lines read by the paranoid case, which saves the offset after"
+             " every line (default: %default).")
+    cmdline.add_option("--dir", action="store",
+        help="Directory to write the logs in (default: a temporary directory).")
+    cmdline.add_option("--output", "-o", action="store",
+        help="Save the results as JSON to this file.")
+    cmdline.add_option("--compare", action="store", metavar="FILE",
+        help="Compare lines/s with the results saved in FILE by an earlier run.")
+    cmdline.add_option("--list", action="store_true",
+        help="List the benchmark cases and exit.")
+
+    options, args = cmdline.parse_args(argv)
+
+    if options.list:
+        for case in CASES.values():
+            print("%-14s %s" % (case.name, case.description))
+        return
+
+    unknown = [name for name in args if name not in CASES]
+    if unknown:
+        cmdline.error("Unknown benchmark: %s (see --list)" % ', '.join(unknown))
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as fh:
+            baseline = json.load(fh)
+
+    report = run_benchmarks(args or None, workdir=options.dir,
+                            size=int(options.size * 1048576),
+                            line_length=options.line_length,
+                            distribution=options.distribution,
+                            seed=options.seed,
+                            every_n=options.every_n,
+                            checkpoint_lines=options.checkpoint_lines)
+
+    print(_format_report(report))
+    if baseline is not None:
+        print("")
+        print("compared with pygtail %s:" % baseline.get('pygtail_version'))
+        for name, lines_per_sec, old_lines_per_sec, ratio in compare(report, baseline):
+            print("%-14s %12.0f %12.0f lines/s  %+.1f%%" % (
+                name, old_lines_per_sec, lines_per_sec, (ratio - 1) * 100))
+    if options.output:
+        with open(options.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+            fh.write('\n')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
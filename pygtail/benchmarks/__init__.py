@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Benchmarks of pygtail's throughput on synthetic logs. Run them with
+`python -m pygtail.bench`.
+"""
+
+from pygtail.benchmarks.cases import CASES
+from pygtail.benchmarks.generate import generate_log, rotate
+from pygtail.benchmarks.runner import DEFAULT_SETTINGS, compare, run_benchmarks
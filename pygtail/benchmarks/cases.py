@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+The benchmarked ways of reading a log. Each case sets up its log files
+(untimed) and then reads them (timed), returning the number of lines and
+bytes read.
+"""
+
+from collections import OrderedDict
+from itertools import islice
+
+from pygtail import Pygtail
+from pygtail.benchmarks.generate import generate_log, rotate
+
+
+class Case(object):
+    """
+    A benchmark: `setup(path, settings)` writes the log `path`, and
+    `run(path, settings)` reads it, returning `(lines, bytes)` read.
+    """
+
+    def __init__(self, name, description, setup, run):
+        self.name = name
+        self.description = description
+        self.setup = setup
+        self.run = run
+
+
+CASES = OrderedDict()
+
+
+def _case(name, description, setup):
+    def register(run):
+        CASES[name] = Case(name, description, setup, run)
+        return run
+    return register
+
+
+def _generate(path, settings, size, seed_offset=0):
+    return generate_log(path, size, settings['line_length'], settings['distribution'],
+                        settings['seed'] + seed_offset)
+
+
+def _setup_log(path, settings):
+    _generate(path, settings, settings['size'])
+
+
+def _setup_rotation(method):
+    """
+    Set up a log of which half has been read, with a quarter more written to
+    it before it was rotated with `method` and another quarter written after,
+    so half the data is left to read, split between the two files. (After a
+    copytruncate, a log can only be seen to have been truncated if it is now
+    smaller than the offset.)
+    """
+    def setup(path, settings):
+        size = settings['size']
+        _generate(path, settings, size // 2)
+        for _ in Pygtail(path).read_batches():
+            pass
+        _generate(path, settings, size // 4, 1)
+        rotate(path, method)
+        _generate(path, settings, size // 4, 2)
+    return setup
+
+
+def _setup_gzip_resume(path, settings):
+    """
+    Set up a log that has been rotated and gzipped with half of it read, so
+    the rest is read by seeking into the middle of the compressed file.
+    """
+    with open(path, 'wb') as fh:
+        fh.write(b'header\n')
+    Pygtail(path).read()
+    lines, _ = _generate(path, settings, settings['size'])
+    rotate(path, 'gzip')
+    half = lines // 2
+    tail = Pygtail(path, every_n=half)
+    _count(islice(tail, half + 1))
+    tail.close()
+
+
+def _count(lines):
+    count = size = 0
+    for line in lines:
+        count += 1
+        size += len(line)
+    return count, size
+
+
+@_case('iterator', "iterate over the lines", _setup_log)
+def _iterator(path, settings):
+    return _count(Pygtail(path))
+
+
+@_case('read', "read() the whole log at once", _setup_log)
+def _read(path, settings):
+    data = Pygtail(path).read() or ''
+    return data.count('\n'), len(data)
+
+
+@_case('readlines', "readlines() the whole log at once", _setup_log)
+def _readlines(path, settings):
+    return _count(Pygtail(path).readlines())
+
+
+@_case('with_offsets', "iterate over the lines with their offsets", _setup_log)
+def _with_offsets(path, settings):
+    return _count(line for line, _ in Pygtail(path).with_offsets())
+
+
+@_case('read_batches', "read blocks of lines with read_batches()", _setup_log)
+def _read_batches(path, settings):
+    count = size = 0
+    for lines in Pygtail(path).read_batches():
+        count += len(lines)
+        size += sum(map(len, lines))
+    return count, size
+
+
+@_case('paranoid', "iterate with paranoid=True (up to checkpoint_lines lines)", _setup_log)
+def _paranoid(path, settings):
+    return _count(islice(Pygtail(path, paranoid=True), settings['checkpoint_lines']))
+
+
+@_case('every_n', "iterate with every_n checkpoints", _setup_log)
+def _every_n(path, settings):
+    return _count(Pygtail(path, every_n=settings['every_n']))
+
+
+@_case('logrotate', "catch up across a logrotate rotation", _setup_rotation('logrotate'))
+def _logrotate(path, settings):
+    return _count(Pygtail(path))
+
+
+@_case('copytruncate', "catch up across a copytruncate rotation", _setup_rotation('copytruncate'))
+def _copytruncate(path, settings):
+    return _count(Pygtail(path))
+
+
+@_case('gzip', "catch up across a compressed rotation", _setup_rotation('gzip'))
+def _gzip(path, settings):
+    return _count(Pygtail(path))
+
+
+@_case('gzip_resume', "resume halfway through a compressed rotated log", _setup_gzip_resume)
+def _gzip_resume(path, settings):
+    return _count(Pygtail(path))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""Generating synthetic logs, and rotating them the ways logrotate does."""
+
+import gzip
+import math
+import os
+import random
+import shutil
+import string
+
+# line length distributions understood by generate_log()
+DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+# bytes of lines generated before each write
+WRITE_CHUNK_BYTES = 1024 * 1024
+
+# rotation methods understood by rotate()
+ROTATION_METHODS = ('logrotate', 'copytruncate', 'gzip')
+
+
+def generate_log(path, size, line_length=120, distribution='uniform', seed=0):
+    """
+    Append about `size` bytes of synthetic log lines to `path`, returning the
+    number of lines and bytes written.
+
+    Line lengths average `line_length` and are all the same ('fixed'), spread
+    evenly between half and one and a half times it ('uniform'), or mostly
+    short with a long tail ('lognormal'), as in access logs with the odd huge
+    URL. The same `seed` always gives the same lines.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError("unknown line length distribution: %r" % distribution)
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + ' =/.-'
+    filler = ''.join(rng.choice(alphabet) for _ in range(64 * 1024))
+    sigma = 0.75
+    mu = math.log(line_length) - sigma * sigma / 2
+
+    lines = written = 0
+    chunk, chunk_bytes = [], 0
+    with open(path, 'ab') as fh:
+        while written + chunk_bytes < size:
+            prefix = "%010d INFO " % lines
+            if distribution == 'fixed':
+                length = line_length
+            elif distribution == 'uniform':
+                length = rng.randint(line_length // 2, line_length * 3 // 2)
+            else:
+                length = int(rng.lognormvariate(mu, sigma))
+            length = min(max(length - len(prefix) - 1, 0), len(filler))
+            start = rng.randrange(len(filler) - length + 1)
+            line = prefix + filler[start:start + length] + '\n'
+            chunk.append(line)
+            chunk_bytes += len(line)
+            lines += 1
+            if chunk_bytes >= WRITE_CHUNK_BYTES:
+                fh.write(''.join(chunk).encode('ascii'))
+                written += chunk_bytes
+                chunk, chunk_bytes = [], 0
+        fh.write(''.join(chunk).encode('ascii'))
+        written += chunk_bytes
+    return lines, written
+
+
+def rotate(path, method='logrotate'):
+    """
+    Rotate the log `path` to `path.1` (or `path.1.gz`), shifting any older
+    generations along, and leave an empty `path` to be written to.
+
+    'logrotate' renames the log and creates a new one; 'copytruncate' copies
+    it and truncates it in place, so the log keeps its inode; and 'gzip'
+    renames and compresses it, like logrotate's `compress` without
+    `delaycompress`.
+    """
+    if method not in ROTATION_METHODS:
+        raise ValueError("unknown rotation method: %r" % method)
+    _shift_generations(path)
+    if method == 'copytruncate':
+        shutil.copyfile(path, "%s.1" % path)
+        with open(path, 'r+b') as fh:
+            fh.truncate()
+        return
+    os.rename(path, "%s.1" % path)
+    open(path, 'wb').close()
+    if method == 'gzip':
+        with open("%s.1" % path, 'rb') as src:
+            with gzip.open("%s.1.gz" % path, 'wb') as dest:
+                shutil.copyfileobj(src, dest, WRITE_CHUNK_BYTES)
+        os.remove("%s.1" % path)
+
+
+def _shift_generations(path):
+    """Rename `path.N` (and `path.N.gz`) to `path.N+1`, oldest first."""
+    generation = 1
+    while os.path.exists("%s.%d" % (path, generation)) or \
+            os.path.exists("%s.%d.gz" % (path, generation)):
+        generation += 1
+    for n in range(generation - 1, 0, -1):
+        for suffix in ('', '.gz'):
+            old = "%s.%d%s" % (path, n, suffix)
+            if os.path.exists(old):
+                os.rename(old, "%s.%d%s" % (path, n + 1, suffix))
+
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""Running benchmark cases, each in a process of its own, and measuring them."""
+
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    # windows
+    resource = None
+
+from pygtail.benchmarks.cases import CASES
+from pygtail.core import __version__
+
+DEFAULT_SETTINGS = {
+    'size': 64 * 1024 * 1024,
+    'line_length': 120,
+    'distribution': 'uniform',
+    'seed': 0,
+    'every_n': 1000,
+    'checkpoint_lines': 1000,
+}
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def run_benchmarks(cases=None, workdir=None, **settings):
+    """
+    Run the named benchmark `cases` (default: all of them) with logs written
+    under `workdir` (default: a temporary directory), returning a report that
+    can be saved as JSON. `settings` override `DEFAULT_SETTINGS`.
+    """
+    settings = dict(DEFAULT_SETTINGS, **settings)
+    for name in cases or ():
+        if name not in CASES:
+            raise ValueError("unknown benchmark: %r" % name)
+    tmpdir = workdir or tempfile.mkdtemp(prefix='pygtail-bench-')
+    results = OrderedDict()
+    try:
+        for name in cases or CASES:
+            results[name] = run_case(name, os.path.join(tmpdir, name), settings)
+    finally:
+        if workdir is None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    return OrderedDict([
+        ('pygtail_version', __version__),
+        ('python', "%s %s" % (platform.python_implementation(), platform.python_version())),
+        ('platform', platform.platform()),
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('settings', settings),
+        ('results', results),
+    ])
+
+
+def run_case(name, directory, settings):
+    """
+    Run the benchmark `name` in a child process, so that its peak RSS and
+    syscall counts are its own, with its logs in `directory` (which is
+    removed afterwards).
+    """
+    os.makedirs(directory)
+    try:
+        results = multiprocessing.Queue()
+        child = multiprocessing.Process(target=_run_in_child,
+                                        args=(name, directory, settings, results))
+        child.start()
+        status, result = results.get()
+        child.join()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    if status != 'ok':
+        raise RuntimeError("benchmark %s failed:\n%s" % (name, result))
+    return result
+
+
+def _run_in_child(name, directory, settings, results):
+    try:
+        results.put(('ok', measure(name, os.path.join(directory, 'bench.log'), settings)))
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+
+
+def measure(name, path, settings):
+    """Set up and run the benchmark `name` on the log `path`, measuring the run."""
+    case = CASES[name]
+    case.setup(path, settings)
+    _reset_peak_rss()
+    io_before = _read_proc_io()
+    cpu_before = os.times()
+    start = _clock()
+    lines, size = case.run(path, settings)
+    elapsed = _clock() - start
+    cpu_after = os.times()
+    io_after = _read_proc_io()
+
+    result = OrderedDict([
+        ('lines', lines),
+        ('bytes', size),
+        ('seconds', elapsed),
+        ('cpu_seconds', (cpu_after[0] - cpu_before[0]) + (cpu_after[1] - cpu_before[1])),
+        ('lines_per_sec', lines / elapsed if elapsed else None),
+        ('mb_per_sec', size / elapsed / 1e6 if elapsed else None),
+    ])
+    for field in ('syscr', 'syscw', 'read_bytes', 'write_bytes'):
+        if field in io_before and field in io_after:
+            result[field] = io_after[field] - io_before[field]
+        else:
+            result[field] = None
+    result['peak_rss_bytes'] = _peak_rss()
+    return result
+
+
+def _read_proc_io():
+    """Return this process's I/O counters, which only Linux has."""
+    counters = {}
+    try:
+        with open('/proc/self/io') as fh:
+            for line in fh:
+                field, _, value = line.partition(':')
+                counters[field.strip()] = int(value)
+    except (IOError, OSError, ValueError):
+        pass
+    return counters
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS to the current RSS, where Linux lets us."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+    except (IOError, OSError):
+        pass
+
+
+def _peak_rss():
+    """Return this process's peak RSS in bytes."""
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def compare(report, baseline):
+    """
+    Return `(case, lines_per_sec, baseline_lines_per_sec, ratio)` for each
+    case in both reports, comparing a run with an earlier one.
+    """
+    comparison = []
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if not old or not old.get('lines_per_sec') or not result.get('lines_per_sec'):
+            continue
+        comparison.append((name, result['lines_per_sec'], old['lines_per_sec'],
+                           result['lines_per_sec'] / old['lines_per_sec']))
+    return comparison
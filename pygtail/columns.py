@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Extracting fields from blocks of structured log lines into columns, for use
+with `Pygtail.column_batches()`.
+"""
+
+import json
+import operator
+import re
+from array import array
+from itertools import chain, repeat
+
+try:
+    from itertools import accumulate
+except ImportError:
+    # python 2
+    accumulate = None
+
+from pygtail.core import PY3, _compile_filter, _newline_for, text_type
+
+# typecode of the arrays of integers (python 2's array has no 'q')
+_INT_TYPECODE = 'q' if PY3 else 'l'
+
+
+class ColumnBatch(object):
+    """
+    The fields extracted from a block of lines, by column.
+
+    `columns` maps each field name to a list of its values, one per row, or
+    to an `array` for fields converted to int or float. `rows` holds the
+    position of each row's line within the block, `errors` counts the lines
+    which couldn't be parsed (and so have no row), and `offset` is the
+    `Offset` just past the block.
+    """
+
+    __slots__ = ('columns', 'rows', 'errors', 'offset')
+
+    def __init__(self, columns, rows, errors, offset=None):
+        self.columns = columns
+        self.rows = rows
+        self.errors = errors
+        self.offset = offset
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return "<ColumnBatch %d rows, %d errors, columns %s>" % (
+            len(self.rows), self.errors, ', '.join(sorted(self.columns)))
+
+
+class _Extractor(object):
+    def __init__(self, types=None):
+        self.types = types or {}
+
+    def _convert(self, name, values):
+        """Convert a column's values per `types`."""
+        convert = self.types.get(name)
+        if convert is None:
+            return list(values)
+        elif convert is int:
+            return array(_INT_TYPECODE, map(int, values))
+        elif convert is float:
+            return array('d', map(float, values))
+        return list(map(convert, values))
+
+
+class RegexExtractor(_Extractor):
+    """
+    Extracts the named groups of `pattern` (a string or compiled regular
+    expression) from each line it matches at the start of. All the matches in
+    a block are found with a single scan, and their groups turned into
+    columns by transposing, rather than a dict per line. A match running on
+    past the end of its line is retried on that line alone. Lines it doesn't
+    match count as errors.
+
+    `types` maps field names to int or float, to get an `array` of numbers
+    for those columns, or to any other function to apply to each value.
+    """
+
+    def __init__(self, pattern, types=None):
+        _Extractor.__init__(self, types)
+        self.pattern = pattern
+        self._compiled = {}
+
+    def extract(self, block):
+        kind = bytes if isinstance(block, bytes) else text_type
+        compiled = self._compiled.get(kind)
+        if compiled is None:
+            pattern = _compile_filter(self.pattern, kind, True)
+            template = b'^(?:%s)' if kind is bytes else '^(?:%s)'
+            compiled = self._compiled[kind] = re.compile(template % pattern.pattern, pattern.flags)
+        names = sorted(compiled.groupindex, key=compiled.groupindex.get)
+
+        newline = _newline_for(block)
+        matches = list(compiled.finditer(block))
+        if matches and matches[-1].start() == len(block):
+            # an empty match after the last newline, not on any line
+            matches.pop()
+        if any(block.find(newline, match.start(), match.end() - 1) >= 0 for match in matches):
+            matches = _line_matches(compiled, block, newline)
+        matches = [(match.start(),) + match.groups() for match in matches]
+        columns = list(zip(*matches)) if matches else [()] * (compiled.groups + 1)
+        lines = block.count(newline) + (not block.endswith(newline))
+        return ColumnBatch(
+            dict((name, self._convert(name, columns[compiled.groupindex[name]])) for name in names),
+            array(_INT_TYPECODE, columns[0]), lines - len(matches))
+
+
+class JSONLinesExtractor(_Extractor):
+    """
+    Extracts `fields` from blocks of JSON lines. Each line is parsed straight
+    with the json module's scanner, sparing the overhead of a `json.loads()`
+    call per line, and must hold a single JSON object; lines which don't count
+    as errors. Missing fields are None. `types` is as for `RegexExtractor`.
+    """
+
+    def __init__(self, fields, types=None, encoding='utf-8'):
+        _Extractor.__init__(self, types)
+        self.fields = list(fields)
+        self.encoding = encoding
+        self._scan = json.JSONDecoder().scan_once
+
+    def extract(self, block):
+        newline = _newline_for(block)
+        lines = block.split(newline)
+        if block.endswith(newline):
+            lines.pop()
+        texts = self._text(block).split(self._text(newline))
+        objects, starts = [], []
+        for start, line in zip(_line_starts(lines), texts):
+            try:
+                obj, end = self._scan(line, 0)
+                if end != len(line):
+                    raise ValueError("more than one value")
+            except (StopIteration, ValueError):
+                # maybe just surrounded by whitespace
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    continue
+            if isinstance(obj, dict):
+                objects.append(obj)
+                starts.append(start)
+
+        columns = dict((field, self._convert(field, map(operator.methodcaller('get', field), objects)))
+                       for field in self.fields)
+        return ColumnBatch(columns, array(_INT_TYPECODE, starts), len(lines) - len(objects))
+
+    def _text(self, data):
+        return data.decode(self.encoding) if isinstance(data, bytes) else data
+
+
+def _line_matches(compiled, block, newline):
+    """
+    Return the matches of `compiled` in `block`, searching each line on its
+    own, so that none runs on past the end of its line.
+    """
+    matches = []
+    pos = 0
+    while pos < len(block):
+        match = compiled.search(block, pos)
+        if match is None or match.start() == len(block):
+            return matches
+        end = block.find(newline, match.start()) + 1 or len(block)
+        if match.end() > end:
+            match = compiled.match(block, match.start(), end)
+        if match is not None:
+            matches.append(match)
+        pos = end
+    return matches
+
+
+def _line_starts(lines):
+    """Return the positions of `lines` in the block they were split from."""
+    if accumulate is None:
+        starts, position = array(_INT_TYPECODE), 0
+        for line in lines:
+            starts.append(position)
+            position += len(line) + 1
+        return starts
+    starts = array(_INT_TYPECODE, accumulate(chain([0], map(operator.add, map(len, lines), repeat(1)))))
+    starts.pop()
+    return starts
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""Reading compressed rotated logs."""
+
+import bz2
+import io
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    # python 2
+    import Queue as queue
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from pygtail.gzindex import open_gzip
+
+# bytes decompressed at a time by the background thread
+DECOMPRESS_CHUNK_BYTES = 1024 * 1024
+
+# decompressed chunks the background thread may get ahead of the reader
+READ_AHEAD_CHUNKS = 4
+
+
+class Codec(object):
+    """
+    A compression format: the extensions of files using it, the magic bytes
+    they start with, if any, and a function `opener(fileobj, index_path)`
+    returning a seekable reader of the uncompressed contents of the file open
+    as `fileobj`. `index_path` is where an index that speeds up seeking may
+    be kept, or None.
+    """
+
+    def __init__(self, name, extensions, magic, opener):
+        self.name = name
+        self.extensions = tuple(extensions)
+        self.magic = magic
+        self.opener = opener
+
+    def __repr__(self):
+        return "<Codec %s>" % self.name
+
+
+_codecs = []
+
+
+def register_codec(name, extensions, magic, opener):
+    """
+    Add a compression format, replacing any registered under the same name.
+    """
+    _codecs[:] = [codec for codec in _codecs if codec.name != name]
+    _codecs.append(Codec(name, extensions, magic, opener))
+
+
+def compressed_extensions():
+    """Return the extensions of all registered compression formats."""
+    return [ext for codec in _codecs for ext in codec.extensions]
+
+
+def codec_for(filename, sniff=False):
+    """
+    Return the codec of `filename` by its extension or, if `sniff` is set,
+    by its first few bytes; or None if it isn't compressed.
+    """
+    for codec in _codecs:
+        if filename.endswith(codec.extensions):
+            return codec
+    if sniff:
+        with open(filename, 'rb') as fh:
+            head = fh.read(16)
+        for codec in _codecs:
+            if codec.magic and head.startswith(codec.magic):
+                return codec
+    return None
+
+
+def open_compressed(filename, codec, index_path=None):
+    """
+    Open the compressed file `filename` for reading as bytes, decompressing
+    in a background thread.
+    """
+    return io.BufferedReader(_ThreadedReader(filename, codec, index_path))
+
+
+class _ThreadedReader(io.RawIOBase):
+    """
+    Raw reader of a compressed file which is decompressed, a few large chunks
+    ahead of the reader, in a background thread. Decompression starts on the
+    first read, from the position seeked to by then; seeking back restarts it.
+    """
+
+    def __init__(self, filename, codec, index_path):
+        io.RawIOBase.__init__(self)
+        self.name = filename
+        self._codec = codec
+        self._index_path = index_path
+        self._fh = open(filename, 'rb')
+        self._thread = None
+        self._queue = None
+        self._stopping = False
+        # the decompressing stream, while the thread has one open
+        self._stream = None
+        self._stream_lock = threading.Lock()
+        self._pos = 0
+        self._chunk = b''
+        self._chunk_pos = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._fh.fileno()
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET:
+            raise ValueError("Seek from end not supported")
+        if self._thread is None or offset < self._pos:
+            self._stop()
+            self._pos = offset
+        else:
+            while self._pos < offset and self._next_chunk():
+                skip = min(offset - self._pos, len(self._chunk) - self._chunk_pos)
+                self._chunk_pos += skip
+                self._pos += skip
+        return self._pos
+
+    def readinto(self, b):
+        if not self._next_chunk():
+            return 0
+        n = min(len(b), len(self._chunk) - self._chunk_pos)
+        b[:n] = self._chunk[self._chunk_pos:self._chunk_pos + n]
+        self._chunk_pos += n
+        self._pos += n
+        return n
+
+    def prefetch(self):
+        """Start decompressing from the current position before the first read."""
+        if self._thread is None:
+            self._start()
+
+    def save_index(self):
+        """
+        Save the index the decompressing stream keeps, for codecs with one,
+        without waiting for it to be closed.
+        """
+        with self._stream_lock:
+            stream = getattr(self._stream, 'raw', self._stream)
+            if hasattr(stream, 'save_index'):
+                stream.save_index()
+
+    def close(self):
+        if not self.closed:
+            self._stop()
+            self._fh.close()
+            io.RawIOBase.close(self)
+
+    def _next_chunk(self):
+        """Make sure some of the current chunk is unread; False at the end."""
+        while self._chunk_pos >= len(self._chunk):
+            if self._eof:
+                return False
+            if self._thread is None:
+                self._start()
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            self._chunk, self._chunk_pos = item, 0
+            self._eof = not item
+        return True
+
+    def _start(self):
+        self._queue = queue.Queue(READ_AHEAD_CHUNKS)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._decompress, args=(self._pos, self._queue))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _stop(self):
+        if self._thread is not None:
+            self._stopping = True
+            self._thread.join()
+            self._thread = None
+        self._chunk, self._chunk_pos = b'', 0
+        self._eof = False
+
+    def _decompress(self, offset, chunks):
+        try:
+            self._fh.seek(0)
+            stream = self._codec.opener(self._fh, self._index_path)
+            self._stream = stream
+            try:
+                if offset:
+                    stream.seek(offset)
+                while True:
+                    data = stream.read(DECOMPRESS_CHUNK_BYTES)
+                    if not self._put(chunks, data) or not data:
+                        break
+            finally:
+                with self._stream_lock:
+                    self._stream = None
+                    stream.close()
+        except Exception as e:
+            self._put(chunks, e)
+
+    def _put(self, chunks, item):
+        while not self._stopping:
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+def _open_bz2(fileobj, index_path):
+    if sys.version_info[0] == 2:
+        # python 2's BZ2File only takes a filename
+        return bz2.BZ2File(fileobj.name, 'rb')
+    return bz2.BZ2File(fileobj, 'rb')
+
+
+def _open_lzma(fileobj, index_path):
+    return lzma.LZMAFile(fileobj, 'rb')
+
+
+def _open_zstd(fileobj, index_path):
+    return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True, closefd=False)
+
+
+register_codec('gzip', ['.gz'], b'\x1f\x8b', open_gzip)
+register_codec('bz2', ['.bz2'], b'BZh', _open_bz2)
+if lzma is not None:
+    register_codec('xz', ['.xz'], b'\xfd7zXZ\x00', _open_lzma)
+    register_codec('lzma', ['.lzma'], None, _open_lzma)
+if zstandard is not None:
+    register_codec('zstd', ['.zst'], b'\x28\xb5\x2f\xfd', _open_zstd)
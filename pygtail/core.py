@@ -25,33 +25,115 @@
 from __future__ import print_function
 from os import fstat, stat
 import os
-from os.path import exists, getsize
+from os.path import exists
 import sys
+import bisect
+import calendar
+import codecs
+import collections
+import ctypes
+import ctypes.util
+import datetime
+import errno
+import fnmatch
 import glob
 import gzip
 import io
+import json
+import mmap
+import multiprocessing
+import re
+import select
+import threading
+import time
 from optparse import OptionParser
 
+try:
+    import queue
+except ImportError:
+    # python 2
+    import Queue as queue
+
+from pygtail.compression import codec_for, compressed_extensions, open_compressed
+from pygtail.offsets import FileOffsetStore, is_offset_store_spec, open_offset_store
+
 __version__ = '0.14.0'
 
 
 PY3 = sys.version_info[0] == 3
 
+_monotonic = getattr(time, 'monotonic', time.time)
+
 if PY3:
     text_type = str
 else:
     text_type = unicode
 
 
+# suffixes of the files pygtail keeps next to logs, which are never logs themselves
+BOOKKEEPING_SUFFIXES = ('.offset', '.offset.tmp', '.gzidx', '.gzidx.tmp')
+
+# default number of bytes (characters, for text-mode files) read per block
+# by the batch reading methods
+DEFAULT_BATCH_BYTES = 1024 * 1024
+
+# size of the blocks read ahead in a background thread with `prefetch`
+READ_AHEAD_BLOCK_BYTES = 1024 * 1024
+
+# defaults for Pygtail.records(): the size past which a record is split, and
+# how long the file must go unmodified for its last record to be complete
+DEFAULT_MAX_RECORD_BYTES = 1024 * 1024
+DEFAULT_RECORD_FLUSH_SECONDS = 5
+
+# bytes copied at a time when copying unread data to a file descriptor
+# can't be left to the kernel
+COPY_BLOCK_BYTES = 1024 * 1024
+
+# bytes read at a time when scanning backwards for the last lines of a file
+BACKWARD_SCAN_BLOCK_BYTES = 64 * 1024
+
+# default number of lines sent to a worker at a time by Pygtail.map()
+DEFAULT_MAP_BATCH_LINES = 1000
+
+# bounds, in seconds, of the adaptive polling interval used in follow mode
+# when inotify isn't available (or as a safety net when it is)
+FOLLOW_POLL_MIN = 0.01
+FOLLOW_POLL_MAX = 0.5
+
+
 def force_text(s, encoding='utf-8', errors='strict'):
     if isinstance(s, text_type):
         return s
     return s.decode(encoding, errors)
 
 
-class Offset:
+def _binary_file(fileobj):
+    """Return the binary file under the text file `fileobj`, or `fileobj`."""
+    return fileobj.buffer if isinstance(fileobj, io.TextIOWrapper) else fileobj
+
+
+def _newline_for(data):
+    """Return the newline of the same type (bytes or text) as `data`."""
+    return b'\n' if isinstance(data, bytes) else u'\n'
+
+
+def _split_lines(data):
+    """
+    Split `data` on newlines only, keeping the line endings. Unlike
+    `splitlines()`, this matches what `readline()` considers a line.
+    Returns the complete lines and the trailing partial line (possibly empty).
+    """
+    newline = _newline_for(data)
+    lines = data.split(newline)
+    partial = lines.pop()
+    return [line + newline for line in lines], partial
+
+
+class Offset(object):
     """Data-class to store file-offsets"""
 
+    __slots__ = ('counter', 'inode', 'offset')
+
     def __init__(self, counter, inode, offset):
         self.counter = counter
         self.inode = inode
@@ -75,16 +157,789 @@ class Offset:
         return not self.__le__(other) or self.__eq__(other)
 
     def __repr__(self):
-        return "Offset(counter=%d, inode=%d, offset=%d" % (
+        return "Offset(counter=%d, inode=%d, offset=%d)" % (
             self.counter,
             self.inode,
             self.offset,
         )
 
 
+class _Stats(object):
+    """
+    Counters of what a Pygtail has done, for `Pygtail.stats()`. They are
+    plain integers bumped where the work is done anyway; the lines and bytes
+    read are only added up when the offset is saved. The `*_seconds` totals
+    are only kept with `timing` on.
+    """
+
+    __slots__ = ('files_opened', 'lines_read', 'bytes_read', 'lines_skipped', 'offset_writes',
+                 'rotations', 'rotation_probes', 'waits', 'warnings',
+                 'read_seconds', 'checkpoint_seconds', 'rotation_probe_seconds', 'wait_seconds')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0.0 if name.endswith('_seconds') else 0)
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class _ReadAheadFile(io.RawIOBase):
+    """
+    Raw reader of a plain file which a background thread reads ahead of, up
+    to `blocks` blocks of `block_size` bytes at a time, with `os.pread()` on
+    the file descriptor, so that reads don't wait on the disk.
+
+    Reading ahead stops at the end of the file and starts again from there on
+    the next read, so that data appended meanwhile is seen. Since the thread
+    reads through the descriptor we opened, it never strays into the file
+    that replaced a rotated log. Seeking discards whatever was read ahead.
+    """
+
+    def __init__(self, filename, blocks, block_size=READ_AHEAD_BLOCK_BYTES):
+        io.RawIOBase.__init__(self)
+        self.name = filename
+        self.blocks = blocks
+        self.block_size = block_size
+        self._fd = os.open(filename, os.O_RDONLY)
+        self._thread = None
+        self._queue = None
+        self._stopping = False
+        self._pos = 0
+        self._block = b''
+        self._block_pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._fd
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += fstat(self._fd).st_size
+        if offset != self._pos:
+            self._stop()
+            self._pos = offset
+        return self._pos
+
+    def readinto(self, b):
+        if self._block_pos >= len(self._block):
+            if self._thread is None:
+                self._start()
+            block = self._queue.get()
+            if isinstance(block, Exception):
+                self._stop()
+                raise block
+            if not block:
+                # the end of the file, for now
+                self._stop()
+                return 0
+            self._block, self._block_pos = block, 0
+        n = min(len(b), len(self._block) - self._block_pos)
+        b[:n] = self._block[self._block_pos:self._block_pos + n]
+        self._block_pos += n
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop()
+            os.close(self._fd)
+            io.RawIOBase.close(self)
+
+    def _start(self):
+        self._queue = queue.Queue(self.blocks)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._read_ahead, args=(self._pos, self._queue))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _stop(self):
+        if self._thread is not None:
+            self._stopping = True
+            self._thread.join()
+            self._thread = None
+        self._block, self._block_pos = b'', 0
+
+    def _read_ahead(self, position, blocks):
+        try:
+            while not self._stopping:
+                if hasattr(os, 'pread'):
+                    block = os.pread(self._fd, self.block_size, position)
+                else:
+                    # only this thread reads the descriptor while it runs
+                    os.lseek(self._fd, position, os.SEEK_SET)
+                    block = os.read(self._fd, self.block_size)
+                if not self._put(blocks, block) or not block:
+                    break
+                position += len(block)
+        except OSError as e:
+            self._put(blocks, e)
+
+    def _put(self, blocks, item):
+        while not self._stopping:
+            try:
+                blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+class _MmapFile(object):
+    """
+    Read-only file object over a memory-mapped file, returning bytes.
+
+    Lines are found with `mmap.find()` and sliced straight out of the mapping,
+    without going through io's buffers. Slices are returned as `bytes` rather
+    than `memoryview`s, since exported views would stop the mapping from being
+    closed or remapped. The file is remapped when a read reaches the end of the
+    mapping and the file has grown.
+
+    As with any mapping, truncating the file while it is being read can kill
+    the process with SIGBUS, so avoid this with long-running copytruncate.
+    """
+
+    def __init__(self, filename):
+        self.name = filename
+        self._file = open(filename, 'rb')
+        self._map = None
+        self._size = 0
+        self._pos = 0
+        self._remap()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            self._remap()
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0 or self._pos + size > self._size:
+            self._remap()
+        end = self._size if size is None or size < 0 else min(self._pos + size, self._size)
+        if self._pos >= end:
+            return b''
+        data = self._map[self._pos:end]
+        self._pos = end
+        return data
+
+    def readline(self, size=-1):
+        if self._pos >= self._size and not self._remap():
+            return b''
+        start = self._pos
+        end = self._map.find(b'\n', start) if self._map is not None else -1
+        if end < 0:
+            # the last line may have been finished since we mapped the file
+            searched = self._size
+            if self._remap():
+                end = self._map.find(b'\n', searched)
+        end = self._size if end < 0 else end + 1
+        if size is not None and size >= 0:
+            end = min(end, start + size)
+        if start >= end:
+            return b''
+        self._pos = end
+        return self._map[start:end]
+
+    def _remap(self):
+        """
+        Remap the file if its size has changed, returning whether it did.
+        """
+        size = fstat(self._file.fileno()).st_size
+        if size == self._size:
+            return False
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        self._size = size
+        return True
+
+
+# errors from sendfile(2) and splice(2) meaning they can't copy between the
+# given descriptors, rather than that copying failed
+_COPY_UNSUPPORTED_ERRNOS = (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP,
+                            getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP))
+
+
+class _RangeCopier(object):
+    """
+    Copies byte ranges of files to the file descriptor `out_fd`: with
+    sendfile(2), else with splice(2) if `out_fd` is a pipe, so the data never
+    passes through Python, and failing both by reading and writing large
+    blocks. Whichever works first is used from then on.
+    """
+
+    def __init__(self, out_fd):
+        self.out_fd = out_fd
+        self._methods = []
+        if hasattr(os, 'sendfile'):
+            self._methods.append(self._sendfile)
+        if hasattr(os, 'splice'):
+            self._methods.append(self._splice)
+        self._methods.append(self._read_write)
+
+    def copy(self, in_fd, offset, count):
+        """
+        Copy up to `count` bytes from `offset` in `in_fd`, returning how many
+        were copied (0 at the end of the file).
+        """
+        while True:
+            try:
+                return self._methods[0](in_fd, offset, count)
+            except OSError as e:
+                if e.errno not in _COPY_UNSUPPORTED_ERRNOS or len(self._methods) == 1:
+                    raise
+                self._methods.pop(0)
+
+    def write(self, data):
+        """Write all of `data`."""
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.out_fd, view):]
+
+    def _sendfile(self, in_fd, offset, count):
+        return os.sendfile(self.out_fd, in_fd, offset, count)
+
+    def _splice(self, in_fd, offset, count):
+        return os.splice(in_fd, self.out_fd, count, offset_src=offset)
+
+    def _read_write(self, in_fd, offset, count):
+        size = min(count, COPY_BLOCK_BYTES)
+        if hasattr(os, 'pread'):
+            data = os.pread(in_fd, size, offset)
+        else:
+            # python 2
+            os.lseek(in_fd, offset, os.SEEK_SET)
+            data = os.read(in_fd, size)
+        self.write(data)
+        return len(data)
+
+
+ROTATED_FILENAME_PATTERNS = [
+    # logrotate dateext rotation scheme - `dateformat -%Y%m%d` + with `delaycompress`
+    "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]",
+    # logrotate dateext rotation scheme - `dateformat -%Y%m%d` + without `delaycompress`
+    "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9].gz",
+    # logrotate dateext rotation scheme - `dateformat -%Y%m%d-%s` + with `delaycompress`
+    "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]",
+    # logrotate dateext rotation scheme - `dateformat -%Y%m%d-%s` + without `delaycompress`
+    "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9].gz",
+    # for TimedRotatingFileHandler
+    "%s.[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]",
+]
+
+# older generations of a log, numbered by logrotate(8) and savelog(8) as
+# `<logfile>.2`, `<logfile>.3.gz`, ..., which are only looked for when
+# catching up on several rotations
+ROTATED_GENERATION_PATTERN = "%s.[0-9]*"
+
+# how much earlier than when it was last written to a rotated log's mtime may
+# be, once copied over at a coarser resolution by whatever compressed it (some
+# tools keep only whole seconds)
+ROTATED_MTIME_SLACK_SECONDS = 1
+
+# a directory listing is only reused if the directory was last modified at
+# least this many seconds before it was listed, since a change made within the
+# filesystem's timestamp granularity of the listing wouldn't change its mtime
+DIRECTORY_LISTING_RACY_SECONDS = 2
+
+_directory_listings = {}
+
+
+class _DirectoryListing(object):
+    """
+    The names and inodes of the entries of a directory, read in one pass.
+    """
+
+    def __init__(self, path, mtime, racy):
+        self.mtime = mtime
+        self.racy = racy
+        self.inodes = {}
+        if hasattr(os, 'scandir'):
+            # the inode comes with each entry, without a stat() call
+            for entry in os.scandir(path or os.curdir):
+                self.inodes[entry.name] = entry.inode()
+        else:
+            for name in os.listdir(path or os.curdir):
+                try:
+                    self.inodes[name] = os.lstat(os.path.join(path, name)).st_ino
+                except OSError:
+                    pass
+        self.names = sorted(self.inodes)
+
+    def match(self, pattern):
+        """Return the names matching the glob `pattern`, in sorted order."""
+        prefix = re.split(r'[*?[]', pattern, 1)[0]
+        matches = []
+        for name in self.names[bisect.bisect_left(self.names, prefix):]:
+            if not name.startswith(prefix):
+                break
+            if fnmatch.fnmatchcase(name, pattern) and (pattern.startswith('.') or not name.startswith('.')):
+                matches.append(name)
+        return matches
+
+
+def _list_directory(path):
+    """
+    Return a listing of the directory at `path`. Listings are shared by all
+    tailers and only redone when the directory has been modified since.
+    """
+    st = os.stat(path or os.curdir)
+    mtime = getattr(st, 'st_mtime_ns', st.st_mtime)
+    listing = _directory_listings.get(path)
+    if listing is None or listing.racy or listing.mtime != mtime:
+        racy = time.time() - st.st_mtime < DIRECTORY_LISTING_RACY_SECONDS
+        listing = _directory_listings[path] = _DirectoryListing(path, mtime, racy)
+    return listing
+
+
+class _Prefetcher(object):
+    """
+    Gets a rotated log ready to be read while the one before it is being read:
+    a compressed log is opened and starts being decompressed in the background,
+    a few chunks ahead as when reading it (using the gzip index at
+    `index_path`, if given), and the kernel is asked to read ahead a plain one.
+    """
+
+    def __init__(self, filename, index_path=None):
+        self.filename = filename
+        self._fh = None
+        codec = codec_for(filename, sniff=True)
+        if codec is not None:
+            self._fh = open_compressed(filename, codec, index_path)
+            self.inode = fstat(self._fh.fileno()).st_ino
+            self._fh.raw.prefetch()
+        else:
+            with open(filename, 'rb') as src:
+                self.inode = fstat(src.fileno()).st_ino
+                if hasattr(os, 'posix_fadvise'):
+                    try:
+                        os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                    except OSError:
+                        pass
+
+    def open(self):
+        """
+        Return the opened compressed log, or None if it should be opened
+        directly.
+        """
+        fh, self._fh = self._fh, None
+        return fh
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class _PollWatcher(object):
+    """
+    Waits for a file to change by sleeping, backing off exponentially from
+    `FOLLOW_POLL_MIN` up to `FOLLOW_POLL_MAX` seconds while nothing happens.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.interval = FOLLOW_POLL_MIN
+
+    def watch(self, filename):
+        self.filename = filename
+
+    def fileno(self):
+        return None
+
+    def next_interval(self):
+        interval = self.interval
+        self.interval = min(self.interval * 2, FOLLOW_POLL_MAX)
+        return interval
+
+    def wait(self):
+        time.sleep(self.next_interval())
+
+    def reset(self):
+        self.interval = FOLLOW_POLL_MIN
+
+    def close(self):
+        pass
+
+
+class _InotifyWatcher(object):
+    """
+    Waits for a file to change using Linux inotify, called through ctypes.
+    The file is watched for writes, and its directory for files being created
+    or moved in, so that rotations are noticed as well.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+    DIRECTORY_EVENTS = IN_CREATE | IN_MOVED_TO
+
+    _libc = None
+
+    def __init__(self, filename):
+        libc = self._load_libc()
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            self._add_watch(os.path.dirname(os.path.abspath(filename)), self.DIRECTORY_EVENTS)
+            self.watch(filename)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    @classmethod
+    def _load_libc(cls):
+        if cls._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            # raises AttributeError if inotify isn't available
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            cls._libc = libc
+        return cls._libc
+
+    def _add_watch(self, path, mask):
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+        wd = self._libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def watch(self, filename):
+        """Watch `filename`, which may be a new file since the last call."""
+        try:
+            self._add_watch(filename, self.FILE_EVENTS)
+        except OSError as e:
+            # the directory watch will tell us when it appears
+            if e.errno != errno.ENOENT:
+                raise
+
+    def fileno(self):
+        return self.fd
+
+    def next_interval(self):
+        # time out anyway, in case events are missed (e.g. on network filesystems)
+        return FOLLOW_POLL_MAX * 2
+
+    def wait(self):
+        if select.select([self.fd], [], [], self.next_interval())[0]:
+            self.drain()
+
+    def drain(self):
+        """Discard pending events."""
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def reset(self):
+        pass
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def _find_last_lines(fileobj, end, n, block_size=BACKWARD_SCAN_BLOCK_BYTES):
+    """
+    Return the position of the start of the `n`th last line before `end` in
+    the binary file `fileobj`, or 0 if there aren't that many, reading
+    backwards from `end` a block at a time.
+    """
+    if n <= 0 or end == 0:
+        return end
+    fileobj.seek(end - 1)
+    if fileobj.read(1) == b'\n':
+        # the final newline ends the last line rather than starting one
+        end -= 1
+    position = end
+    while position > 0:
+        start = max(position - block_size, 0)
+        fileobj.seek(start)
+        block = fileobj.read(position - start)
+        count = block.count(b'\n')
+        if count >= n:
+            index = len(block)
+            for _ in range(n):
+                index = block.rindex(b'\n', 0, index)
+            return start + index + 1
+        n -= count
+        position = start
+    return 0
+
+
+def _find_last_lines_forwards(fileobj, n):
+    """
+    Return the position of the start of the `n`th last line of the binary
+    file `fileobj`, or 0 if there aren't that many, by reading it from the
+    current position (the start) to the end, for files that can't be read
+    backwards.
+    """
+    if n <= 0:
+        fileobj.seek(0, os.SEEK_END)
+        return fileobj.tell()
+    starts = collections.deque(maxlen=n)
+    position = 0
+    for line in iter(fileobj.readline, b''):
+        starts.append(position)
+        position += len(line)
+    return starts[0] if starts else 0
+
+
+def regex_timestamp_parser(pattern, format='%Y-%m-%d %H:%M:%S'):
+    """
+    Return a timestamp parser for `Pygtail(since=...)` which searches each
+    line for the regular expression `pattern` and parses the text of its
+    `timestamp` group (or else its first group, or the whole match) with
+    `datetime.strptime(text, format)`. Lines it doesn't match have no
+    timestamp.
+    """
+    compiled = re.compile(pattern)
+    if 'timestamp' in compiled.groupindex:
+        group = 'timestamp'
+    else:
+        group = 1 if compiled.groups else 0
+
+    def parse(line):
+        match = compiled.search(line)
+        if match is None:
+            return None
+        try:
+            return datetime.datetime.strptime(match.group(group), format)
+        except ValueError:
+            return None
+    return parse
+
+
+_ISO_TIMESTAMP = re.compile(r'(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})')
+_CLF_TIMESTAMP = re.compile(r'\[(\d{2}/[A-Za-z]{3}/\d{4}:\d{2}:\d{2}:\d{2})')
+
+
+def default_timestamp_parser(line):
+    """
+    Return the timestamp of `line`: the first ISO 8601 date and time in it
+    (`2024-05-01 14:05:00` or `2024-05-01T14:05:00`), or else a common log
+    format one (`[01/May/2024:14:05:00`), ignoring fractions of a second and
+    time zones; or None if it has neither.
+    """
+    try:
+        match = _ISO_TIMESTAMP.search(line)
+        if match:
+            return datetime.datetime.strptime(' '.join(match.groups()), '%Y-%m-%d %H:%M:%S')
+        match = _CLF_TIMESTAMP.search(line)
+        if match:
+            return datetime.datetime.strptime(match.group(1), '%d/%b/%Y:%H:%M:%S')
+    except ValueError:
+        pass
+    return None
+
+
+def _bisect_since(fileobj, size, since, timestamp_of):
+    """
+    Return the position of the first line of the binary file `fileobj` (of
+    `size` bytes) timestamped at or after `since`, or `size` if there is none,
+    by binary search, assuming the timestamps are in order. Each probe starts
+    at the next line, and lines without a timestamp (the rest of a multi-line
+    record) are skipped over.
+    """
+    def probe(position):
+        if position:
+            # realign to the start of the next line
+            fileobj.seek(position - 1)
+            fileobj.readline()
+        else:
+            fileobj.seek(0)
+        while True:
+            start = fileobj.tell()
+            line = fileobj.readline()
+            if not line:
+                return size, None
+            timestamp = timestamp_of(line)
+            if timestamp is not None:
+                return start, timestamp
+
+    low, high = 0, size
+    while low < high:
+        middle = (low + high) // 2
+        start, timestamp = probe(middle)
+        if timestamp is None or timestamp >= since:
+            high = middle
+        else:
+            # every probe up to that line lands on it too
+            low = start + 1
+    return probe(low)[0]
+
+
+def _find_since_forwards(fileobj, since, timestamp_of):
+    """
+    Return the position of the first line of the binary file `fileobj`
+    timestamped at or after `since`, reading it from the start, for files
+    that can't be searched.
+    """
+    position = 0
+    for line in iter(fileobj.readline, b''):
+        timestamp = timestamp_of(line)
+        if timestamp is not None and timestamp >= since:
+            break
+        position += len(line)
+    return position
+
+
+def _to_unix_time(dt):
+    """Return the Unix time of the `datetime` `dt`, naive ones being local."""
+    if dt.tzinfo is None:
+        return time.mktime(dt.timetuple()) + dt.microsecond / 1e6
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+def _stat_or_none(filename):
+    """Return `stat(filename)`, or None if it doesn't exist."""
+    try:
+        return stat(filename)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+
+
+def _make_watcher(filename):
+    """Return an inotify watcher on Linux, or a polling one elsewhere."""
+    if sys.platform.startswith('linux'):
+        try:
+            return _InotifyWatcher(filename)
+        except (OSError, AttributeError):
+            pass
+    return _PollWatcher(filename)
+
+
+def _map_lines(func, lines):
+    """Apply `func` to a batch of lines for `Pygtail.map()`, in a worker."""
+    return [func(line) for line in lines]
+
+
+def _compile_filter(pattern, kind, multiline=False):
+    """
+    Compile the regular expression `pattern` (a string or compiled pattern,
+    or None) for searching data of type `kind` (bytes or text): a single line
+    or record, or, if `multiline` is set, a block of lines, with `^` and `$`
+    matching at the start and end of each line.
+    """
+    if pattern is None:
+        return None
+    source = getattr(pattern, 'pattern', pattern)
+    flags = getattr(pattern, 'flags', 0)
+    if multiline:
+        flags |= re.MULTILINE
+    if kind is bytes and not isinstance(source, bytes):
+        source = source.encode('utf-8')
+        flags &= ~re.UNICODE
+    elif kind is not bytes and isinstance(source, bytes):
+        source = source.decode('utf-8')
+    return re.compile(source, flags)
+
+
+def _filter_block(block, newline, patterns, line_patterns):
+    """
+    Return the lines of `block` that match `include` (if given) and don't
+    match `exclude` (if given), still joined together. `patterns` are the
+    `(include, exclude)` patterns for searching blocks, and `line_patterns`
+    the same for single lines. Matches are searched for over the whole block,
+    and only the lines they fall on are looked at. A match running on past
+    the end of its line is only taken if the line matches on its own too, as
+    when reading line by line.
+    """
+    include, exclude = patterns
+    line_include, line_exclude = line_patterns
+    if include is not None:
+        pattern, line_pattern, keep = include, line_include, True
+    else:
+        pattern, line_pattern, keep = exclude, line_exclude, False
+    kept = []
+    pos = 0  # start of the lines not yet excluded, without `keep`
+    search = 0
+    while search < len(block):
+        match = pattern.search(block, search)
+        if match is None:
+            break
+        start = block.rfind(newline, search, match.start()) + 1 or search
+        end = block.find(newline, match.start())
+        end = len(block) if end < 0 else end + 1
+        line = block[start:end]
+        search = end
+        if match.end() > end and not line_pattern.search(line):
+            continue
+        if keep:
+            if line_exclude is None or not line_exclude.search(line):
+                kept.append(line)
+        else:
+            kept.append(block[pos:start])
+            pos = end
+    if not keep:
+        kept.append(block[pos:])
+    return block[:0].join(kept)
+
+
+def _compile_record_boundary(record_start, continuation, kind):
+    """
+    Compile a pattern matching (with zero width) at the start of each line
+    starting a record, for `Pygtail.records()`.
+    """
+    if record_start is not None:
+        pattern, template = _compile_filter(record_start, kind, True), '^(?:%s)'
+    else:
+        pattern, template = _compile_filter(continuation, kind, True), '^(?!(?:%s))'
+    if kind is bytes:
+        template = template.encode('ascii')
+    return re.compile(template % pattern.pattern, pattern.flags)
+
+
 class PygtailIteratorWithOffsets:
     def __init__(self, pygtail):
         self._pygtail = pygtail
+        self._counter = None
+        self._position = 0
 
     def __next__(self):
         return self.next()
@@ -93,12 +948,17 @@ class PygtailIteratorWithOffsets:
         return self
 
     def next(self):
-        next_line = self._pygtail.next()
-        offset = self._pygtail._filehandle().tell()
-        inode = fstat(self._pygtail._filehandle().fileno()).st_ino
-        counter = self._pygtail._counter
-        offset_instance = Offset(counter, inode, offset)
-        return next_line, offset_instance
+        pygtail = self._pygtail
+        next_line = pygtail.next()
+        if pygtail._counter != self._counter or not isinstance(next_line, bytes) or \
+                pygtail._filtering:
+            # a new filehandle, text whose length in bytes we can't tell, or
+            # lines filtered out in between
+            self._counter = pygtail._counter
+            self._position = pygtail.fh.tell()
+        else:
+            self._position += len(next_line)
+        return next_line, Offset(self._counter, pygtail._fh_inode, self._position)
 
 
 class Pygtail(object):
@@ -107,22 +967,64 @@ class Pygtail(object):
 
     Keyword arguments:
     offset_file   File to which offset data is written (default: <logfile>.offset).
+    offset_store  `OffsetStore` in which to save offsets instead, e.g. one shared by
+                  many logs, keyed by `offset_file` if given or else by the absolute
+                  path of the log (default: a `FileOffsetStore`)
     paranoid      Update the offset file every time we read a line (as opposed to
                   only when we reach the end of the file (default: False))
     every_n       Update the offset file every n'th line (as opposed to only when
                   we reach the end of the file (default: 0))
+    checkpoint_interval
+                  Update the offset file when a line is read at least this many seconds
+                  after the last update (default: 0, meaning never)
+    checkpoint_bytes
+                  Update the offset file once this many bytes (characters in text mode)
+                  have been read since the last update (default: 0, meaning never)
     on_update     Execute this function when offset data is written (default False)
     copytruncate  Support copytruncate-style log rotation (default: True)
     log_patterns  List of custom rotated log patterns to match (default: None)
     full_lines    Only log when line ends in a newline `\n` (default: False)
     save_on_end   Automatically save the offset once the end of the file is reached (default: True)
+    encoding      Encoding to use for reading files (default: system encoding)
+    binary        Read files as raw bytes, without decoding or newline translation,
+                  and return lines as `bytes` (default: False)
+    use_mmap      Read uncompressed files through a memory map instead of io buffers;
+                  requires `binary` (default: False)
+    follow        Keep waiting for new lines at the end of the file, following it
+                  across rotations, instead of stopping (default: False)
+    prefetch      Read uncompressed files up to this many 1 MiB blocks ahead in a
+                  background thread (default: 0, meaning not at all)
+    include       Regular expression (string or compiled); only lines in which it is
+                  found are returned (default: None)
+    exclude       Regular expression (string or compiled); lines in which it is found
+                  are skipped (default: None)
+    start_lines   If no offset has been saved, start this many lines before the end of
+                  the file instead of at the beginning (or, with `read_from_end`, the
+                  end); found by reading backwards from the end (default: None)
+    since         If no offset has been saved, start at the first line timestamped at
+                  or after this `datetime` (or Unix time), in the oldest rotated
+                  generation modified since then, or the log itself; found by binary
+                  search, assuming timestamps are in order (default: None)
+    timestamp_parser
+                  Function returning the timestamp of a line, as a naive `datetime`,
+                  or None if it has none, for `since` (default:
+                  `default_timestamp_parser`; see also `regex_timestamp_parser`)
+    timing        Time reads, offset saves, rotation probes and follow-mode waits,
+                  adding the seconds up in `stats()`; if a function, it is also
+                  called with the event ('read', 'checkpoint', 'rotation_probe' or
+                  'wait') and the seconds it took, every time (default: False)
     """
     def __init__(self, filename, offset_file=None, paranoid=False, copytruncate=True,
                  every_n=0, on_update=False, read_from_end=False, log_patterns=None, full_lines=False,
-                 save_on_end=True, encoding=None):
+                 save_on_end=True, encoding=None, binary=False, use_mmap=False, follow=False,
+                 offset_store=None, checkpoint_interval=0, checkpoint_bytes=0, prefetch=0,
+                 include=None, exclude=None, timing=False, start_lines=None, since=None,
+                 timestamp_parser=None):
         self.filename = filename
         self.paranoid = paranoid
         self.every_n = every_n
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_bytes = checkpoint_bytes
         self.on_update = on_update
         self.copytruncate = copytruncate
         self.read_from_end = read_from_end
@@ -130,36 +1032,100 @@ class Pygtail(object):
         self.full_lines = full_lines
         self.save_on_end = save_on_end
         self.encoding = encoding
+        self.binary = binary
+        self.use_mmap = use_mmap
+        self.follow = follow
+        self.prefetch = prefetch
+        self.include = include
+        self.exclude = exclude
+        self._filtering = include is not None or exclude is not None
+        self._compiled_filters = {}
+        self.timing = timing
+        self.start_lines = start_lines
+        if isinstance(since, (int, float)):
+            since = datetime.datetime.fromtimestamp(since)
+        elif since is not None and since.tzinfo is not None:
+            # lines' timestamps are compared as local times
+            since = datetime.datetime.fromtimestamp(_to_unix_time(since))
+        self.since = since
+        self.timestamp_parser = timestamp_parser or default_timestamp_parser
+        self._stats = _Stats()
         self.offset_file = offset_file or "%s.offset" % self.filename
+        if offset_store is None:
+            self.offset_store = FileOffsetStore()
+            self._offset_key = self.offset_file
+        else:
+            self.offset_store = offset_store
+            self._offset_key = offset_file or os.path.abspath(self.filename)
         self.offset_file_inode = 0
         self.offset = 0
         self.since_update = 0
+        self._bytes_since_update = 0
+        self._last_update = _monotonic()
+        self._saved_at = None
+        # the block records() is part way through yielding, and how far
+        self._unyielded = None
         self.fh = None
         self.rotated_logfile = None
+        self._backlog = []
+        # getting ready the next generation in the backlog, and the one
+        # about to be opened
+        self._prefetcher = None
+        self._prefetched = None
         self._counter = 0
+        self._fh_inode = None
+        self._closed_inode = None
+        self._seek_to_end = False
+        self._start_lines = None
+        self._since = None
+        self._watcher = None
+        self._watched_counter = None
+        self._eof_size = None
+        self._wait_position = self._wait_size = None
 
-        # if offset file exists and non-empty, open and parse it
-        if exists(self.offset_file) and getsize(self.offset_file):
-            offset_fh = open(self.offset_file, "r")
-            (self.offset_file_inode, self.offset) = \
-                [int(line.strip()) for line in offset_fh]
-            offset_fh.close()
+        if self.use_mmap and not self.binary:
+            raise ValueError("use_mmap requires binary=True")
+        if self.use_mmap and self.prefetch:
+            raise ValueError("use_mmap and prefetch can't be combined")
+        if start_lines is not None and since is not None:
+            raise ValueError("start_lines and since can't be combined")
+
+        # if offset data has been saved, pick up where it left off
+        saved = self.offset_store.load(self._offset_key)
+        if saved is None:
+            if start_lines is not None:
+                self._start_lines = start_lines
+            elif since is not None:
+                self._start_since()
+            else:
+                self._seek_to_end = read_from_end
+        else:
+            (self.offset_file_inode, self.offset) = saved
             if self.offset_file_inode != stat(self.filename).st_ino or \
                     stat(self.filename).st_size < self.offset:
                 # The inode has changed or filesize has reduced so the file
                 # might have been rotated.
-                # Look for the rotated file and process that if we find it.
-                self.rotated_logfile = self._determine_rotated_logfile()
-                # If copytruncate is enabled and we can't find the rotated logfile, all we can do is reset.
-                if self.copytruncate and self.rotated_logfile is None:
-                    sys.stderr.write("[pygtail] [WARN] log file was rotated to unknown location. Resetting.\n")
-                    self.offset = 0
-                    self.update_offset_file()
-
+                self._handle_rotation(self.offset_store.saved_at(self._offset_key))
 
     def __del__(self):
-        if self._filehandle():
-            self._filehandle().close()
+        self.close()
+
+    def close(self):
+        """
+        Close the file being tailed. If reading continues, it is reopened where
+        it left off, or at its rotated location if it was rotated meanwhile.
+        """
+        if not self._is_closed():
+            self.offset = self._filehandle().tell()
+            self._closed_inode = self._fh_inode
+            self.fh.close()
+        for prefetcher in (self._prefetcher, self._prefetched):
+            if prefetcher:
+                prefetcher.close()
+        self._prefetcher = self._prefetched = None
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
 
     def __iter__(self):
         return self
@@ -168,38 +1134,289 @@ class Pygtail(object):
         """
         Return the next line in the file, updating the offset.
         """
+        while True:
+            try:
+                line = self._get_next_line()
+                break
+            except StopIteration:
+                # we've reached the end of the file; if we're processing the
+                # rotated log file or the file has been renamed, we can continue with the actual file; otherwise
+                # update the offset file
+                if self._is_new_file():
+                    self._advance_file()
+                    # open up current logfile and continue
+                    try:
+                        line = self._get_next_line()
+                        break
+                    except StopIteration:  # oops, empty file
+                        pass
+                if self.save_on_end:
+                    self.update_offset_file()
+                if not self._wait_for_data():
+                    raise StopIteration
+
+        self._maybe_update_offset_file()
+
+        return line
+
+    def read_batches(self, max_bytes=DEFAULT_BATCH_BYTES, max_lines=None, decode=False):
+        """
+        Generator yielding unread lines in lists, reading the file in large
+        blocks rather than a line at a time.
+
+        Each block of roughly `max_bytes` is read with a single call, split on
+        newlines in bulk and completed up to the next newline, so the file
+        position always lies on a line boundary between blocks. `max_lines`
+        caps the length of each yielded list. Offsets are updated (per
+        `paranoid`, `every_n`, `save_on_end` etc.) at block boundaries, and
+        rotated files are followed just as when iterating line by line. In
+        follow mode, this waits for more lines instead of ending.
+
+        If `decode` is true, blocks read as bytes (in binary mode) are decoded
+        with a single call per block, using `encoding` (default: utf-8), and
+        text lines are yielded.
+        """
+        decoder = None
+        if decode:
+            decoder = codecs.getincrementaldecoder(self.encoding or 'utf-8')()
+
+        while True:
+            lines = self._next_block(max_bytes, decoder)
+            if lines is None:
+                if self._wait_for_data():
+                    continue
+                if decoder is not None:
+                    # raises if the file ended in the middle of a character
+                    decoder.decode(b'', True)
+                return
+
+            if max_lines and len(lines) > max_lines:
+                for i in range(0, len(lines), max_lines):
+                    yield lines[i:i + max_lines]
+            else:
+                yield lines
+
+    def with_offsets(self):
+        """Returns an iterator that yields lines with their internal offset state"""
+        return PygtailIteratorWithOffsets(self)
+
+    def batches_with_offsets(self, max_bytes=DEFAULT_BATCH_BYTES, decode=False):
+        """
+        Generator yielding `(lines, offset)` pairs, one per block read as in
+        `read_batches()`, where `offset` is the `Offset` just past the last line
+        of the batch and can be passed to `write_offset_to_file()`.
+        """
+        for lines in self.read_batches(max_bytes, decode=decode):
+            yield lines, Offset(self._counter, self._fh_inode, self.fh.tell())
+
+    def column_batches(self, extractor, max_bytes=DEFAULT_BATCH_BYTES):
+        """
+        Generator yielding a `ColumnBatch` of fields extracted by `extractor`
+        (a `RegexExtractor` or `JSONLinesExtractor`) from each block read as in
+        `read_batches()`, without making an object per line. The batch's
+        `offset` is the `Offset` just past the block. In follow mode, this waits
+        for more lines instead of ending.
+        """
+        while True:
+            block = self._next_block(max_bytes, split=False)
+            if block is None:
+                if self._wait_for_data():
+                    continue
+                return
+            batch = extractor.extract(block)
+            batch.offset = Offset(self._counter, self._fh_inode, self.fh.tell())
+            yield batch
+
+    def map(self, func, workers=None, executor='process', batch_size=DEFAULT_MAP_BATCH_LINES,
+            max_bytes=DEFAULT_BATCH_BYTES):
+        """
+        Generator yielding `func(line)` for each unread line, in order, with
+        the calls made in parallel by a pool of `workers`.
+
+        Lines are sent to the pool in batches of up to `batch_size`. `executor`
+        is 'process' (the default; `func` must then be picklable), 'thread', or
+        a `concurrent.futures.Executor` to use (on python 2, the first two need
+        the `futures` backport). Batches may finish in any order, but the
+        offset is only saved once the results of a block and of every block
+        before it have been yielded, so a line is never marked as read before
+        it has been processed; `paranoid`, `every_n` and the other update
+        options don't apply. In follow mode, results are yielded as they come
+        in while waiting for more lines.
+        """
+        workers = workers or multiprocessing.cpu_count()
+        if executor in ('process', 'thread'):
+            try:
+                from concurrent import futures
+            except ImportError:
+                raise ImportError("map() needs concurrent.futures to make a pool (on python 2, "
+                                  "install the 'futures' backport), or an executor to be given")
+            if executor == 'process':
+                pool = futures.ProcessPoolExecutor(workers)
+            else:
+                pool = futures.ThreadPoolExecutor(workers)
+        else:
+            pool = executor
+        # (future, offset to save once its results are yielded, or None)
+        pending = collections.deque()
         try:
-            line = self._get_next_line()
-        except StopIteration:
-            # we've reached the end of the file; if we're processing the
-            # rotated log file or the file has been renamed, we can continue with the actual file; otherwise
-            # update the offset file
-            if self._is_new_file():
-                self.rotated_logfile = None
-                self.fh.close()
-                self.offset = 0
-                # open up current logfile and continue
-                try:
-                    line = self._get_next_line()
-                except StopIteration:  # oops, empty file
+            while True:
+                lines = self._next_block(max_bytes, save=False)
+                if lines is None:
+                    while pending:
+                        for result in self._finish_batch(pending.popleft()):
+                            yield result
                     if self.save_on_end:
                         self.update_offset_file()
-                    raise
+                    if self._wait_for_data():
+                        continue
+                    return
+                offset = Offset(self._counter, self._fh_inode, self.fh.tell())
+                for i in range(0, len(lines), batch_size):
+                    batch = lines[i:i + batch_size]
+                    pending.append((pool.submit(_map_lines, func, batch),
+                                    offset if i + batch_size >= len(lines) else None))
+                    # keep the pool busy without reading too far ahead
+                    while len(pending) >= 2 * workers:
+                        for result in self._finish_batch(pending.popleft()):
+                            yield result
+        finally:
+            for future, offset in pending:
+                future.cancel()
+            if pool is not executor:
+                pool.shutdown()
+
+    def _finish_batch(self, batch):
+        """
+        Yield the results of a batch submitted by `map()`, then save the offset
+        that came with it, if any.
+        """
+        future, offset = batch
+        for result in future.result():
+            yield result
+        if offset is not None:
+            self.write_offset_to_file(offset)
+
+    def records(self, record_start=None, continuation=None, max_record_bytes=DEFAULT_MAX_RECORD_BYTES,
+                flush_timeout=DEFAULT_RECORD_FLUSH_SECONDS, max_bytes=DEFAULT_BATCH_BYTES):
+        """
+        Generator yielding unread multi-line records, such as stack traces,
+        each as a single string of one or more lines.
+
+        Records are told apart by a regular expression matching either the
+        first line of each record (`record_start`) or each line continuing one
+        (`continuation`); give exactly one. Records are cut straight out of
+        blocks of about `max_bytes` read as in `read_batches()`, so their lines
+        are never joined back together. A record growing past
+        `max_record_bytes` is split there.
+
+        The offset is only ever saved between records: a record still being
+        written is left unread, to be read whole later, and so are the records
+        not yet yielded if iteration stops early (or anything else reads or
+        saves the offset meanwhile). The last record in the file is taken to
+        be complete once the file has gone unmodified for `flush_timeout`
+        seconds (None: never), or once the file has been rotated. In follow
+        mode, this waits for more lines instead of ending.
+        `include` and `exclude` apply to whole records.
+        """
+        if (record_start is None) == (continuation is None):
+            raise ValueError("give one of record_start and continuation")
+        boundaries = {}
+        read_size = max_bytes
+        while True:
+            fh = self._filehandle()
+            start = fh.tell()
+            block = self._read_raw_block(read_size, filtered=False)
+            if not block:
+                if self._is_new_file():
+                    self._advance_file()
+                    continue
+                if self.save_on_end:
+                    self.update_offset_file()
+                if self._wait_for_data():
+                    continue
+                return
+
+            kind = bytes if isinstance(block, bytes) else text_type
+            if kind not in boundaries:
+                boundaries[kind] = _compile_record_boundary(record_start, continuation, kind)
+            cuts = [match.start() for match in boundaries[kind].finditer(block)
+                    if 0 < match.start() < len(block)]
+            end = cuts[-1] if cuts else 0
+            at_eof = len(block) < read_size
+            if len(block) - end >= max_record_bytes or \
+                    (at_eof and (self._is_new_file() or self._record_timed_out(flush_timeout))):
+                # the last record is complete (or as complete as it's allowed to get)
+                cuts.append(len(block))
+                end = len(block)
             else:
+                # leave the last record to be read again, whole, and counted then
+                self._seek_into_block(start, block, end)
+                rest = block[end:]
+                newline = _newline_for(rest)
+                self._bytes_since_update -= len(rest)
+                self.since_update -= rest.count(newline) + (not rest.endswith(newline))
+
+            if not end:
+                if not at_eof:
+                    # a record longer than the block
+                    read_size += max_bytes
+                    continue
                 if self.save_on_end:
                     self.update_offset_file()
+                if self._wait_for_data(self._record_time_left(flush_timeout)):
+                    continue
+                return
+
+            read_size = max_bytes
+            include, exclude = self._filter_patterns(block)
+            unyielded = None
+            try:
+                for i, j in zip([0] + cuts, cuts):
+                    record = block[i:j]
+                    if (include is None or include.search(record)) and \
+                            (exclude is None or not exclude.search(record)):
+                        # should anything else read from here meanwhile, it
+                        # gets the records after this one
+                        unyielded = self._unyielded = (start, block, j, end) if j < end else None
+                        yield record
+                        if self._unyielded is not unyielded:
+                            # it did; go on from wherever it left off
+                            break
+                        self._unyielded = None
+            except GeneratorExit:
+                # stopped early: leave the rest to be read next time
+                if unyielded is not None and self._unyielded is unyielded and not self._is_closed():
+                    self._unread_unyielded()
                 raise
+            self._maybe_update_offset_file()
 
-        if self.paranoid:
-            self.update_offset_file()
-        elif self.every_n and self.every_n <= self.since_update:
-            self.update_offset_file()
+    def _unread_unyielded(self):
+        """
+        Seek back to the end of the last record `records()` yielded, leaving
+        the rest of its block to be read (and counted) again.
+        """
+        start, block, consumed, end = self._unyielded
+        self._unyielded = None
+        self._seek_into_block(start, block, consumed)
+        rest = block[consumed:end]
+        if rest:
+            newline = _newline_for(rest)
+            self._bytes_since_update -= len(rest)
+            self.since_update -= rest.count(newline) + (not rest.endswith(newline))
 
-        return line
+    def _record_timed_out(self, flush_timeout):
+        """Return whether the file has gone unmodified for `flush_timeout`."""
+        return self._record_time_left(flush_timeout) == 0
 
-    def with_offsets(self):
-        """Returns an iterator that yields lines with their internal offset state"""
-        return PygtailIteratorWithOffsets(self)
+    def _record_time_left(self, flush_timeout):
+        """
+        Return the seconds until the file will have gone unmodified for
+        `flush_timeout`, or None if that doesn't count.
+        """
+        if flush_timeout is None:
+            return None
+        idle = time.time() - fstat(self._filehandle().fileno()).st_mtime
+        return max(flush_timeout - idle, 0)
 
     def __next__(self):
         """`__next__` is the Python 3 version of `next`"""
@@ -211,18 +1428,178 @@ class Pygtail(object):
         """
         return [line for line in self]
 
-    def read(self):
+    def read(self, max_bytes=None):
         """
-        Read in all unread lines and return them as a single string.
+        Read in unread lines and return them as a single string, or None if
+        there are none.
+
+        With `max_bytes`, at most that many bytes (characters, in text mode)
+        of whole lines are read, in a single block, so memory use is bounded
+        however much is unread, and the offset is left (and, with
+        `save_on_end`, saved) at the start of the next line; call again for
+        more. Fewer may be returned, say at the end of a rotated file, and a
+        single line longer than `max_bytes` is read whole. Without it, all
+        unread lines are read, a block at a time rather than a line at a time.
         """
-        lines = self.readlines()
-        if lines:
-            try:
-                return ''.join(lines)
-            except TypeError:
-                return ''.join(force_text(line) for line in lines)
-        else:
+        if max_bytes is None:
+            out = io.BytesIO() if self.binary else io.StringIO()
+            self.copy_to(out)
+            return out.getvalue() or None
+        block = self._next_block(max_bytes, save=False, split=False, bounded=True)
+        if self.save_on_end:
+            # as this may well be the last read made before exiting
+            self.update_offset_file()
+        elif block:
+            self._maybe_update_offset_file()
+        return block or None
+
+    def copy_to(self, fileobj, chunk_size=DEFAULT_BATCH_BYTES):
+        """
+        Write all unread lines to `fileobj`, in blocks of about `chunk_size`
+        (extended to the end of their last line), so that memory use stays the
+        same however much is unread. The lines are bytes in binary mode and
+        text otherwise. Offsets are updated (per `paranoid`, `every_n`,
+        `save_on_end` etc.) only once each block has been written, and in
+        follow mode, this keeps copying lines as they come. Return the number
+        of bytes (characters, in text mode) written.
+        """
+        written = 0
+        while True:
+            block = self._next_block(chunk_size, save=False, split=False)
+            if block is None:
+                if self.save_on_end:
+                    self.update_offset_file()
+                if self._wait_for_data():
+                    continue
+                return written
+            fileobj.write(block)
+            written += len(block)
+            self._maybe_update_offset_file()
+
+    def _copy_to_fd(self, fd):
+        """
+        Copy all unread data, exactly as it is in the log, to the file
+        descriptor `fd`, moving on from rotated files to the current one, and
+        save the offset once at the end (if `save_on_end` is set). Plain files
+        are copied by the kernel where it can, without the data passing
+        through Python. Lines are neither filtered nor counted. Return the
+        number of bytes copied.
+        """
+        copier = _RangeCopier(fd)
+        copied = 0
+        while True:
+            fh = self._filehandle()
+            if self.timing:
+                started = _monotonic()
+            if self._fh_plain:
+                in_fd = fh.fileno()
+                start = position = fh.tell()
+                end = fstat(in_fd).st_size
+                while position < end:
+                    n = copier.copy(in_fd, position, end - position)
+                    if not n:
+                        # truncated while we were copying
+                        break
+                    position += n
+                fh.seek(position)
+                n = position - start
+            else:
+                n = 0
+                fh = _binary_file(fh)
+                while True:
+                    block = fh.read(COPY_BLOCK_BYTES)
+                    if not block:
+                        break
+                    copier.write(block)
+                    n += len(block)
+            if self.timing:
+                self._timed('read', started)
+            self._bytes_since_update += n
+            copied += n
+            if not self._is_new_file():
+                break
+            self._advance_file()
+        if self.save_on_end:
+            self.update_offset_file()
+        return copied
+
+    def pending_bytes(self):
+        """
+        Return the number of bytes left to read: the rest of the file being
+        read, any rotated generations after it, and the current log. The files
+        are only stat()ed, never opened; compressed rotated logs count in
+        full, at their compressed size.
+        """
+        return sum(pending for filename, pending in self._pending_files())
+
+    def lag(self):
+        """
+        Return how many seconds unread data has been waiting, at most: the time
+        since the offset was last saved, or 0 if everything has been read, or
+        None if it's not known when the offset was saved.
+        """
+        if not self.pending_bytes():
+            return 0
+        saved_at = self._saved_at or self.offset_store.saved_at(self._offset_key)
+        if saved_at is None:
             return None
+        return max(time.time() - saved_at, 0)
+
+    def _pending_files(self):
+        """
+        Return `(filename, bytes left to read)` for each file with something
+        left to read, in the order they'll be read.
+        """
+        current = self.rotated_logfile or self.filename
+        later = [filename for filename, inode in self._backlog]
+        if self.rotated_logfile:
+            later.append(self.filename)
+        if self._is_closed():
+            st = _stat_or_none(current)
+            size = st.st_size if st else 0
+            position = size if self._seek_to_end else self.offset
+        else:
+            size = fstat(self.fh.fileno()).st_size
+            position = self._filehandle().tell()
+            st = _stat_or_none(self.filename)
+            if not self.rotated_logfile and st and st.st_ino != self._fh_inode:
+                # renamed while we were reading it
+                later.append(self.filename)
+        if codec_for(current) is not None:
+            # the position is in the uncompressed data
+            position = 0
+
+        pending = [(current, max(size - position, 0))]
+        for filename in later:
+            st = _stat_or_none(filename)
+            if st:
+                pending.append((filename, st.st_size))
+        return [(filename, size) for filename, size in pending if size]
+
+    def stats(self):
+        """
+        Return a dict of counters: files opened, lines and bytes (characters in
+        text mode) read, lines skipped by `include`/`exclude`, offset writes,
+        rotations detected, rotation probes (directory scans for rotated
+        files), follow-mode waits and warnings, plus, with `timing` on, the
+        seconds spent reading, saving offsets, probing and waiting.
+        """
+        stats = self._stats.as_dict()
+        stats['lines_read'] += self.since_update
+        stats['bytes_read'] += self._bytes_since_update
+        return stats
+
+    def _timed(self, event, started):
+        """Add the time since `started` to the `event`'s total, for `timing`."""
+        seconds = _monotonic() - started
+        name = event + '_seconds'
+        setattr(self._stats, name, getattr(self._stats, name) + seconds)
+        if callable(self.timing):
+            self.timing(event, seconds)
+
+    def _warn(self, message):
+        self._stats.warnings += 1
+        sys.stderr.write("[pygtail] [WARN] %s\n" % message)
 
     def _is_closed(self):
         if not self.fh:
@@ -241,62 +1618,210 @@ class Pygtail(object):
         Return a filehandle to the file being tailed, with the position set
         to the current offset.
         """
+        if self._unyielded is not None:
+            self._unread_unyielded()
         if not self.fh or self._is_closed():
             self._counter += 1
+            self._stats.files_opened += 1
             filename = self.rotated_logfile or self.filename
-            if filename.endswith('.gz'):
-                self.fh = gzip.open(filename, 'r')
+            prefetched, inode = self._take_prefetched(filename)
+            if prefetched is None:
+                # rotated logs are recognised by their contents if need be
+                codec = codec_for(filename, sniff=filename == self.rotated_logfile)
+            if prefetched is not None or codec is not None:
+                if prefetched is not None:
+                    self.fh = prefetched
+                else:
+                    self.fh = open_compressed(filename, codec, self._gzip_index_path(stat(filename).st_ino))
+                if not self.binary:
+                    # decompressed bytes, to be read as text like any other log
+                    self.fh = io.TextIOWrapper(self.fh, encoding=self.encoding)
+            elif self.use_mmap:
+                self.fh = _MmapFile(filename)
+            elif self.prefetch:
+                self.fh = io.BufferedReader(_ReadAheadFile(filename, self.prefetch))
+                if not self.binary:
+                    self.fh = io.TextIOWrapper(self.fh, encoding=self.encoding)
+            elif self.binary:
+                self.fh = open(filename, 'rb')
             elif PY3:
                 self.fh = open(filename, "r", 1, encoding=self.encoding)
             else:
                 self.fh = io.open(filename, "r", 1, encoding=self.encoding)
-            if self.read_from_end and not exists(self.offset_file):
+            self._fh_inode = inode or fstat(self.fh.fileno()).st_ino
+            # whether the descriptor's bytes are the log's, not compressed ones
+            self._fh_plain = prefetched is None and codec is None
+            if self._closed_inode is not None and not self.rotated_logfile:
+                closed_inode, self._closed_inode = self._closed_inode, None
+                if closed_inode != self._fh_inode or fstat(self.fh.fileno()).st_size < self.offset:
+                    # rotated since we closed it
+                    self.fh.close()
+                    self.offset_file_inode = closed_inode
+                    self._handle_rotation()
+                    return self._filehandle()
+            if self._seek_to_end:
                 self.fh.seek(0, os.SEEK_END)
+                self._seek_to_end = False
+            elif self._start_lines is not None:
+                self.fh.seek(self._start_of_last_lines(filename, self._start_lines))
+                self._start_lines = None
+            elif self._since is not None:
+                self.fh.seek(self._position_since(filename, self._since))
+                self._since = None
             else:
                 self.fh.seek(self.offset)
 
         return self.fh
 
+    def _start_of_last_lines(self, filename, n):
+        """
+        Return the position of the start of the `n`th last line of the newly
+        opened `filename`. Compressed files can't be read backwards, so they
+        are read through instead, keeping only the last `n` line positions.
+        """
+        if codec_for(filename) is not None:
+            return _find_last_lines_forwards(_binary_file(self.fh), n)
+        # read the bytes through a descriptor of our own, whatever the mode of fh
+        with io.open(self.fh.fileno(), 'rb', closefd=False) as raw:
+            return _find_last_lines(raw, fstat(raw.fileno()).st_size, n)
+
+    def _start_since(self):
+        """
+        Arrange to start reading at the first line timestamped at or after
+        `since`. Rotated generations last modified before then hold no such
+        line, so we start in the oldest one modified since, if any.
+        """
+        since = _to_unix_time(self.since)
+        generations = [(filename, inode) for mtime, filename, inode
+                       in self._rotated_generations() if mtime >= since]
+        if generations:
+            self.rotated_logfile = generations[0][0]
+            self._backlog = generations[1:]
+            self._prefetch()
+        self._since = self.since
+
+    def _position_since(self, filename, since):
+        """
+        Return the position of the first line timestamped at or after `since`
+        in the newly opened `filename`. Compressed files can't be searched, so
+        they are read through up to that line instead.
+        """
+        encoding = self.encoding or 'utf-8'
+
+        def timestamp_of(line):
+            return self.timestamp_parser(line.decode(encoding, 'replace'))
+
+        if codec_for(filename, sniff=filename == self.rotated_logfile) is not None:
+            return _find_since_forwards(_binary_file(self.fh), since, timestamp_of)
+        with io.open(self.fh.fileno(), 'rb', closefd=False) as raw:
+            return _bisect_since(raw, fstat(raw.fileno()).st_size, since, timestamp_of)
+
+    def _gzip_index_path(self, inode):
+        """
+        Return where the gzip index of the rotated log with `inode` is kept;
+        each generation has its own, as the next one may be prefetched while
+        one is being read.
+        """
+        return "%s.%d.gzidx" % (self.offset_file, inode)
+
+    def _save_gzip_index(self):
+        """
+        Save the gzip index of the rotated log being read along with its
+        offset, so that it isn't lost if we never get to close the log.
+        """
+        if not self._is_closed() and not self._fh_plain:
+            save_index = getattr(getattr(_binary_file(self.fh), 'raw', None), 'save_index', None)
+            if save_index is not None:
+                save_index()
+
+    def _remove_gzip_indexes(self):
+        """Remove the gzip indexes of all rotated logs, once all are read."""
+        directory, name = os.path.split(self.offset_file)
+        prefix = name + '.'
+        for entry in os.listdir(directory or os.curdir):
+            if entry.startswith(prefix) and entry.endswith('.gzidx') and \
+                    entry[len(prefix):-len('.gzidx')].isdigit():
+                try:
+                    os.remove(os.path.join(directory, entry))
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+
+    def _take_prefetched(self, filename):
+        """
+        Return the prefetched copy of `filename`, if there is one, and its
+        inode; otherwise `(None, None)`.
+        """
+        prefetcher, self._prefetched = self._prefetched, None
+        if prefetcher is None:
+            return None, None
+        try:
+            if filename == self.rotated_logfile and stat(filename).st_ino == prefetcher.inode:
+                fh = prefetcher.open()
+                if fh is not None:
+                    return fh, prefetcher.inode
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        prefetcher.close()
+        return None, None
+
     def update_offset_file(self):
         """
         Update the offset file with the current inode and offset.
         """
         if self.on_update:
             self.on_update()
+        if self.timing:
+            started = _monotonic()
         offset = self._filehandle().tell()
-        inode = fstat(self._filehandle().fileno()).st_ino
-        fh = open(self.offset_file, "w")
-        fh.write("%s\n%s\n" % (inode, offset))
-        fh.close()
+        self.offset_store.save(self._offset_key, self._fh_inode, offset)
+        self._save_gzip_index()
+        stats = self._stats
+        stats.offset_writes += 1
+        stats.lines_read += self.since_update
+        stats.bytes_read += self._bytes_since_update
+        if self.timing:
+            self._timed('checkpoint', started)
         self.since_update = 0
+        self._bytes_since_update = 0
+        self._last_update = _monotonic()
+        self._saved_at = time.time()
 
     def write_offset_to_file(self, offset):
         """Writes an `Offset` to the offset file"""
         if self.on_update:
             self.on_update()
-        fh = open(self.offset_file, "w")
-        fh.write("%s\n%s\n" % (offset.inode, offset.offset))
-        fh.close()
+        if self.timing:
+            started = _monotonic()
+        self.offset_store.save(self._offset_key, offset.inode, offset.offset)
+        self._save_gzip_index()
+        self._stats.offset_writes += 1
+        self._saved_at = time.time()
+        if self.timing:
+            self._timed('checkpoint', started)
 
     def _determine_rotated_logfile(self):
         """
         We suspect the logfile has been rotated, so try to guess what the
         rotated filename is, and return it.
         """
-        rotated_filename = self._check_rotated_filename_candidates()
-        if rotated_filename and exists(rotated_filename):
-            if stat(rotated_filename).st_ino == self.offset_file_inode:
+        candidates = self._rotated_filename_candidates()
+        for rotated_filename, inode in candidates:
+            if inode == self.offset_file_inode:
                 return rotated_filename
 
+        if candidates:
+            rotated_filename = candidates[0][0]
             # if the inode hasn't changed, then the file shrank; this is expected with copytruncate,
             # otherwise print a warning
             if stat(self.filename).st_ino == self.offset_file_inode:
                 if self.copytruncate:
                     return rotated_filename
                 else:
-                    sys.stderr.write(
-                        "[pygtail] [WARN] file size of %s shrank, and copytruncate support is "
-                        "disabled (expected at least %d bytes, was %d bytes).\n" %
+                    self._warn(
+                        "file size of %s shrank, and copytruncate support is "
+                        "disabled (expected at least %d bytes, was %d bytes)." %
                         (self.filename, self.offset, stat(self.filename).st_size))
 
         return None
@@ -306,86 +1831,567 @@ class Pygtail(object):
         Check for various rotated logfile filename patterns and return the first
         match we find.
         """
+        candidates = self._rotated_filename_candidates()
+        if candidates:
+            return candidates[0][0]
+
+        # no match
+        return None
+
+    def _rotated_filename_candidates(self):
+        """
+        Return `(filename, inode)` for every file matching one of the rotated
+        logfile filename patterns, the most likely match first. Directories
+        are listed once and the listing shared, rather than probed per name.
+        """
+        self._stats.rotation_probes += 1
+        if self.timing:
+            started = _monotonic()
+        # break into directory and filename components to support cases where the
+        # the file is prepended as part of rotation
+        file_dir, rel_filename = os.path.split(self.filename)
+        listing = _list_directory(file_dir)
+        candidates = []
+
+        def add(name):
+            inode = listing.inodes.get(name)
+            if inode is not None:
+                candidates.append((os.path.join(file_dir, name), inode))
+
         # savelog(8)
-        candidate = "%s.0" % self.filename
-        if (exists(candidate) and exists("%s.1.gz" % self.filename) and
-            (stat(candidate).st_mtime > stat("%s.1.gz" % self.filename).st_mtime)):
-            return candidate
+        candidate, compressed = "%s.0" % rel_filename, "%s.1.gz" % rel_filename
+        if candidate in listing.inodes and compressed in listing.inodes and \
+                stat(os.path.join(file_dir, candidate)).st_mtime > \
+                stat(os.path.join(file_dir, compressed)).st_mtime:
+            add(candidate)
 
         # logrotate(8)
         # with delaycompress
-        candidate = "%s.1" % self.filename
-        if exists(candidate):
-            return candidate
-
+        add("%s.1" % rel_filename)
         # without delaycompress
-        candidate = "%s.1.gz" % self.filename
-        if exists(candidate):
-            return candidate
-
-        rotated_filename_patterns = [
-            # logrotate dateext rotation scheme - `dateformat -%Y%m%d` + with `delaycompress`
-            "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]",
-            # logrotate dateext rotation scheme - `dateformat -%Y%m%d` + without `delaycompress`
-            "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9].gz",
-            # logrotate dateext rotation scheme - `dateformat -%Y%m%d-%s` + with `delaycompress`
-            "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]",
-            # logrotate dateext rotation scheme - `dateformat -%Y%m%d-%s` + without `delaycompress`
-            "%s-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]-[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9].gz",
-            # for TimedRotatingFileHandler
-            "%s.[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]",
-        ]
+        for ext in compressed_extensions():
+            add("%s.1%s" % (rel_filename, ext))
+
+        rotated_filename_patterns = []
+        for rotated_filename_pattern in ROTATED_FILENAME_PATTERNS:
+            rotated_filename_patterns.append(rotated_filename_pattern)
+            if rotated_filename_pattern.endswith('.gz'):
+                # the same name with any other compression format's extension
+                base = rotated_filename_pattern[:-len('.gz')]
+                rotated_filename_patterns.extend(base + ext for ext in compressed_extensions()
+                                                 if ext != '.gz')
         if self.log_patterns:
             rotated_filename_patterns.extend(self.log_patterns)
 
-        # break into directory and filename components to support cases where the
-        # the file is prepended as part of rotation
-        file_dir, rel_filename = os.path.split(self.filename)
         for rotated_filename_pattern in rotated_filename_patterns:
-            candidates = glob.glob(os.path.join(file_dir, rotated_filename_pattern % rel_filename))
-            if candidates:
-                candidates.sort()
-                return candidates[-1]  # return most recent
+            pattern_dir, name_pattern = os.path.split(
+                os.path.join(file_dir, rotated_filename_pattern % rel_filename))
+            if glob.has_magic(pattern_dir):
+                matches = [(filename, stat(filename).st_ino)
+                           for filename in glob.glob(os.path.join(pattern_dir, name_pattern))]
+            elif pattern_dir == file_dir:
+                matches = [(os.path.join(file_dir, name), listing.inodes[name])
+                           for name in listing.match(name_pattern)]
+            else:
+                other_listing = _list_directory(pattern_dir)
+                matches = [(os.path.join(pattern_dir, name), other_listing.inodes[name])
+                           for name in other_listing.match(name_pattern)]
+            # most recent first
+            candidates.extend(sorted(matches, reverse=True))
 
-        # no match
+        if self.timing:
+            self._timed('rotation_probe', started)
+        return candidates
+
+    def _rotated_generations(self):
+        """
+        Return `(mtime, filename, inode)` for every rotated generation of the
+        log we can find, oldest first.
+        """
+        file_dir, rel_filename = os.path.split(self.filename)
+        listing = _list_directory(file_dir)
+        filenames = [filename for filename, inode in self._rotated_filename_candidates()]
+        filenames.extend(os.path.join(file_dir, name)
+                         for name in listing.match(ROTATED_GENERATION_PATTERN % rel_filename))
+        generations = {}
+        for filename in filenames:
+            try:
+                st = stat(filename)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            generations[filename] = (st.st_mtime, filename, st.st_ino)
+        return sorted(generations.values())
+
+    def _catch_up_plan(self, saved_at):
+        """
+        Return `(filename, inode)` for the rotated generations still to be read,
+        oldest first: the one holding the saved inode and every one after it.
+        A rotated log that was compressed (or copied, with copytruncate) has a
+        new inode, so failing that, the first generation last modified after
+        the offset was saved, at `saved_at`, is taken to be the one we were
+        reading, allowing for the mtime having been copied over coarsely.
+        """
+        generations = self._rotated_generations()
+        for i, (mtime, filename, inode) in enumerate(generations):
+            if inode == self.offset_file_inode:
+                return [(filename, inode) for mtime, filename, inode in generations[i:]]
+        if saved_at is not None and (self.copytruncate or
+                                     stat(self.filename).st_ino != self.offset_file_inode):
+            for i, (mtime, filename, inode) in enumerate(generations):
+                if mtime > saved_at - ROTATED_MTIME_SLACK_SECONDS:
+                    return [(filename, inode) for mtime, filename, inode in generations[i:]]
+        return []
+
+    def _next_rotated_logfile(self):
+        """
+        Return the next rotated generation still to be read, or None, and start
+        prefetching the one after it. A generation renamed by another rotation
+        in the meantime is found again by its inode.
+        """
+        while self._backlog:
+            filename, inode = self._backlog.pop(0)
+            try:
+                found = stat(filename).st_ino == inode
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                found = False
+            if not found:
+                renamed = [candidate for mtime, candidate, candidate_inode
+                           in self._rotated_generations() if candidate_inode == inode]
+                if not renamed:
+                    self._warn("rotated log file %s was removed before it could be read. "
+                               "Skipping." % filename)
+                    continue
+                filename = renamed[0]
+            if self._prefetcher and self._prefetcher.inode == inode:
+                # hand it over to be opened
+                self._prefetched, self._prefetcher = self._prefetcher, None
+            self._prefetch()
+            return filename
         return None
 
+    def _prefetch(self):
+        """Start getting the next rotated generation ready, if there is one."""
+        if self._prefetcher and self._backlog and self._prefetcher.inode == self._backlog[0][1]:
+            return
+        if self._prefetcher:
+            self._prefetcher.close()
+            self._prefetcher = None
+        if self._backlog:
+            filename, inode = self._backlog[0]
+            try:
+                self._prefetcher = _Prefetcher(filename, self._gzip_index_path(inode))
+            except (IOError, OSError):
+                # it will be looked for again when we get to it
+                pass
+
+    def _next_block(self, max_bytes, decoder=None, save=True, split=True, bounded=False):
+        """
+        Return the next block of unread lines, moving on from a rotated file to
+        the current one as needed, or None at the end of the file (saving the
+        offset if `save_on_end` is set). With `save` false, the offset is left
+        for the caller to save. With `split` false, the block is returned as
+        read, without being decoded or split into lines, and `bounded` is as
+        for `_read_raw_block()`.
+        """
+        while True:
+            if split:
+                lines = self._read_block(max_bytes, decoder)
+            else:
+                lines = self._read_raw_block(max_bytes, bounded=bounded)
+            if lines:
+                if save:
+                    self._maybe_update_offset_file()
+                return lines
+            if self._is_new_file():
+                self._advance_file()
+                continue
+            if self.save_on_end and save:
+                self.update_offset_file()
+            return None
+
+    def _advance_file(self):
+        """
+        Stop reading the rotated (or renamed) file and move on to the next
+        rotated generation still to be read, if any, or else to the current
+        logfile, which will be opened from the beginning.
+        """
+        if not self._is_closed():
+            # (saving its gzip index, if it has one)
+            self.fh.close()
+        if self._fh_inode is not None and exists(self._gzip_index_path(self._fh_inode)):
+            # done with the compressed log it indexes
+            os.remove(self._gzip_index_path(self._fh_inode))
+        if not self.rotated_logfile:
+            # the file being read was renamed
+            self._stats.rotations += 1
+        self.rotated_logfile = self._next_rotated_logfile()
+        if self.rotated_logfile is None:
+            # caught up, so any indexes left behind are stale
+            self._remove_gzip_indexes()
+        self._closed_inode = None
+        self.offset = 0
+
+    def _handle_rotation(self, saved_at=None):
+        """
+        The file at our saved offset has been rotated or truncated. Look for
+        the rotated file and process that if we find it, followed by any later
+        generations rotated since. `saved_at` is when the offset was saved, if
+        known.
+        """
+        self._stats.rotations += 1
+        self._locate_rotated_logfile(saved_at)
+        self._prefetch()
+        # If copytruncate is enabled and we can't find the rotated logfile, all we can do is reset.
+        if self.copytruncate and self.rotated_logfile is None:
+            self._warn("log file was rotated to unknown location. Resetting.")
+            self.offset = 0
+            self.update_offset_file()
+
+    def _locate_rotated_logfile(self, saved_at):
+        """
+        Set `rotated_logfile` to the rotated file holding our saved offset, or
+        None if it can't be found, and `_backlog` to the generations after it.
+        """
+        plan = self._catch_up_plan(saved_at)
+        if plan:
+            self._backlog = plan[1:]
+            self.rotated_logfile = plan[0][0]
+        else:
+            self._backlog = []
+            self.rotated_logfile = self._determine_rotated_logfile()
+
+    def _wait_for_data(self, timeout=None):
+        """
+        In follow mode, block until the file we're at the end of has grown, or
+        has been rotated, or for at most `timeout` seconds if given, and return
+        True. Otherwise return False straight away.
+        """
+        if not self.follow:
+            return False
+        if not self._prepare_wait():
+            self._stats.waits += 1
+            if self.timing:
+                started = _monotonic()
+            deadline = None if timeout is None else _monotonic() + timeout
+            while deadline is None or _monotonic() < deadline:
+                self._watcher.wait()
+                if self._check_for_data():
+                    break
+            if self.timing:
+                self._timed('wait', started)
+        self._watcher.reset()
+        return True
+
+    def _prepare_wait(self):
+        """
+        Get ready to wait for more data at the end of the file, returning True
+        if some has arrived already.
+        """
+        if self._watcher is None:
+            self._watcher = _make_watcher(self.filename)
+            self._watched_counter = self._counter
+        elif self._watched_counter != self._counter:
+            self._watcher.watch(self.filename)
+            self._watched_counter = self._counter
+
+        fh = self._filehandle()
+        self._wait_position = fh.tell()
+        self._wait_size = fstat(fh.fileno()).st_size
+        if self._wait_position < self._wait_size != self._eof_size:
+            # the file grew before we started waiting
+            self._eof_size = self._wait_size
+            return True
+        return False
+
+    def _check_for_data(self):
+        """
+        Check whether, since `_prepare_wait()`, the file has grown, or has been
+        rotated (in which case we move on to the rotated or the new file).
+        """
+        fh = self._filehandle()
+        position, size = self._wait_position, self._wait_size
+        new_size = fstat(fh.fileno()).st_size
+        if new_size < position <= size:
+            # truncated in place (copytruncate): finish the rotated copy
+            self.offset_file_inode = self._fh_inode
+            self.offset = position
+            fh.close()
+            self._handle_rotation()
+        elif new_size == size:
+            try:
+                renamed = stat(self.filename).st_ino != self._fh_inode
+            except OSError as e:
+                # rotated, but the new file hasn't been created yet
+                if e.errno != errno.ENOENT:
+                    raise
+                renamed = False
+            if not renamed:
+                return False
+            if not self._is_new_file():
+                # only an incomplete line is left in the old file; drop it
+                self._advance_file()
+        self._eof_size = new_size
+        return True
+
+    def _maybe_update_offset_file(self):
+        if self.paranoid:
+            self.update_offset_file()
+        elif self.every_n and self.every_n <= self.since_update:
+            self.update_offset_file()
+        elif self.checkpoint_bytes and self.checkpoint_bytes <= self._bytes_since_update:
+            self.update_offset_file()
+        elif self.checkpoint_interval and \
+                self.checkpoint_interval <= _monotonic() - self._last_update:
+            self.update_offset_file()
+
     def _is_new_file(self):
         # Processing rotated logfile or at the end of current file which has been renamed
-        return self.rotated_logfile or \
-               self._filehandle().tell() == fstat(self._filehandle().fileno()).st_size and \
-               fstat(self._filehandle().fileno()).st_ino != stat(self.filename).st_ino
+        if self.rotated_logfile:
+            return True
+        fh = self._filehandle()
+        if fh.tell() != fstat(fh.fileno()).st_size:
+            return False
+        try:
+            return self._fh_inode != stat(self.filename).st_ino
+        except OSError as e:
+            # renamed, but the new file hasn't been created yet
+            if e.errno == errno.ENOENT:
+                return False
+            raise
 
     def _get_next_line(self):
-        curr_offset = self._filehandle().tell()
-        line = self._filehandle().readline()
-        if self.full_lines:
-            if not line.endswith('\n'):
-                self._filehandle().seek(curr_offset)
+        fh = self._filehandle()
+        while True:
+            if self.full_lines:
+                curr_offset = fh.tell()
+            if self.timing:
+                started = _monotonic()
+            line = fh.readline()
+            if self.timing:
+                self._timed('read', started)
+            if self.full_lines:
+                if not line.endswith(_newline_for(line)):
+                    fh.seek(curr_offset)
+                    raise StopIteration
+            if not line:
                 raise StopIteration
-        if not line:
-            raise StopIteration
-        self.since_update += 1
-        return line
+            self.since_update += 1
+            self._bytes_since_update += len(line)
+            if not self._filtering:
+                return line
+            include, exclude = self._filter_patterns(line)
+            if (include is None or include.search(line)) and \
+                    (exclude is None or not exclude.search(line)):
+                return line
+            self._stats.lines_skipped += 1
+
+    def _filter_patterns(self, data, multiline=False):
+        """
+        Return the `include` and `exclude` patterns compiled for data of the
+        type of `data` (bytes or text), for searching single lines or, if
+        `multiline` is set, blocks of them.
+        """
+        key = (bytes if isinstance(data, bytes) else text_type, multiline)
+        if key not in self._compiled_filters:
+            self._compiled_filters[key] = (_compile_filter(self.include, key[0], multiline),
+                                           _compile_filter(self.exclude, key[0], multiline))
+        return self._compiled_filters[key]
+
+    def _read_block(self, max_bytes, decoder=None):
+        """
+        Read a block of about `max_bytes`, extended to the end of its last
+        line, and return it split into lines. An empty list means there is
+        nothing (or, with `full_lines`, no complete line) left to read.
+        Bytes are decoded with `decoder`, if given, before being split.
+        """
+        block = self._read_raw_block(max_bytes)
+        if not block:
+            return []
+        if decoder is not None and isinstance(block, bytes):
+            block = decoder.decode(block)
+        lines, partial = _split_lines(block)
+        if partial:
+            lines.append(partial)
+        return lines
+
+    def _read_raw_block(self, max_bytes, filtered=True, bounded=False):
+        """
+        Read a block of about `max_bytes`, extended to the end of its last
+        line, and return it unsplit, with the lines excluded by `include` and
+        `exclude` taken out unless `filtered` is false. An empty block means
+        there is nothing (or, with `full_lines`, no complete line) left to read.
+        If `bounded` is set, the block is instead cut back to the end of its
+        last whole line, so it's at most `max_bytes` long unless it holds a
+        single longer line.
+        """
+        fh = self._filehandle()
+        while True:
+            start = fh.tell()
+            if self.timing:
+                started = _monotonic()
+            block = fh.read(max_bytes)
+            newline = _newline_for(block)
+            if block and not block.endswith(newline):
+                if not bounded:
+                    block += fh.readline()
+                elif len(block) == max_bytes and newline in block:
+                    # leave the line running past the limit to be read next time
+                    end = block.rfind(newline) + 1
+                    self._seek_into_block(start, block, end)
+                    block = block[:end]
+                elif len(block) == max_bytes:
+                    block += fh.readline()
+            if self.timing:
+                self._timed('read', started)
+            if not block:
+                return block
+            if self.full_lines and not block.endswith(newline):
+                # leave the incomplete line to be read once it is finished
+                end = block.rfind(newline) + 1
+                self._seek_into_block(start, block, end)
+                block = block[:end]
+                if not block:
+                    return block
+
+            lines = block.count(newline) + (not block.endswith(newline))
+            self._bytes_since_update += len(block)
+            self.since_update += lines
+            if filtered and self._filtering:
+                # filter before decoding or splitting, so dropped lines cost nothing
+                block = _filter_block(block, newline, self._filter_patterns(block, True),
+                                      self._filter_patterns(block))
+                if not block:
+                    self._stats.lines_skipped += lines
+                    continue
+                self._stats.lines_skipped += \
+                    lines - block.count(newline) - (not block.endswith(newline))
+            return block
+
+    def _seek_into_block(self, start, block, consumed):
+        """
+        Position the filehandle `consumed` bytes (or characters) into `block`,
+        which was read from position `start`.
+        """
+        fh = self._filehandle()
+        if isinstance(block, bytes):
+            fh.seek(start + consumed)
+        else:
+            # text-mode positions are opaque cookies, so replay the read
+            fh.seek(start)
+            fh.read(consumed)
+
+
+class _StatusProbe(Pygtail):
+    """
+    A Pygtail that only works out where it would resume reading, for
+    `pending_bytes()` and `lag()`, without opening, reading or saving anything
+    on rotation.
+    """
+
+    def _handle_rotation(self, saved_at=None):
+        self._locate_rotated_logfile(saved_at)
+        if self.copytruncate and self.rotated_logfile is None:
+            # it would start again from the beginning of the log
+            self.offset = 0
+
+
+def _status(patterns, **kwargs):
+    """
+    Return a dict of the unread data in each log file matching `patterns`
+    (file names or globs), going by their offsets and stat() alone.
+    """
+    filenames = []
+    for pattern in patterns:
+        matches = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        filenames.extend(sorted(filename for filename in matches
+                                if not filename.endswith(BOOKKEEPING_SUFFIXES)))
+    rows = []
+    for filename in filenames:
+        if not exists(filename):
+            rows.append({'file': filename, 'error': "no such file"})
+            continue
+        try:
+            probe = _StatusProbe(filename, **kwargs)
+        except (IOError, OSError) as e:
+            rows.append({'file': filename, 'error': str(e)})
+            continue
+        pending = probe._pending_files()
+        rows.append({
+            'file': filename,
+            'pending_bytes': sum(size for name, size in pending),
+            'pending_files': len(pending),
+            'lag_seconds': probe.lag(),
+        })
+    return rows
+
+
+def _format_status(rows):
+    lines = ["%15s %6s %10s  %s" % ("pending bytes", "files", "lag (s)", "log file")]
+    for row in rows:
+        if 'error' in row:
+            lines.append("%15s %6s %10s  %s (%s)" % ("-", "-", "-", row['file'], row['error']))
+        else:
+            lag = row['lag_seconds']
+            lines.append("%15d %6d %10s  %s" % (row['pending_bytes'], row['pending_files'],
+                                                "-" if lag is None else "%.0f" % lag, row['file']))
+    return "\n".join(lines) + "\n"
+
+
+def _parse_since(text):
+    """Parse the --since option: a local date and time, or a time today."""
+    for format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M',
+                   '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text, format)
+        except ValueError:
+            pass
+    for format in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.datetime.combine(datetime.date.today(),
+                                             datetime.datetime.strptime(text, format).time())
+        except ValueError:
+            pass
+    raise ValueError("unrecognised date and time: %r" % text)
 
 
 def main():
     # command-line parsing
-    cmdline = OptionParser(usage="usage: %prog [options] logfile",
+    cmdline = OptionParser(usage="usage: %prog [options] logfile\n"
+                                 "       %prog --status [options] logfile|glob ...",
         description="Print log file lines that have not been read.")
     cmdline.add_option("--offset-file", "-o", action="store",
-        help="File to which offset data is written (default: <logfile>.offset).")
+        help="File to which offset data is written (default: <logfile>.offset),"
+             " or an offset store shared between logs: sqlite:PATH or journal:PATH.")
     cmdline.add_option("--paranoid", "-p", action="store_true",
         help="Update the offset file every time we read a line (as opposed to"
              " only when we reach the end of the file).")
     cmdline.add_option("--every-n", "-n", action="store",
         help="Update the offset file every n'th time we read a line (as opposed to"
              " only when we reach the end of the file).")
+    cmdline.add_option("--checkpoint-interval", action="store", type="float",
+        help="Update the offset file when a line is read at least this many seconds"
+             " after the last update.")
+    cmdline.add_option("--checkpoint-bytes", action="store", type="int",
+        help="Update the offset file every time this many bytes have been read.")
     cmdline.add_option("--no-copytruncate", action="store_true",
         help="Don't support copytruncate-style log rotation. Instead, if the log file"
              " shrinks, print a warning.")
     cmdline.add_option("--read-from-end", action="store_true",
         help="Read log file from the end if offset file is missing. Useful for large files.")
+    cmdline.add_option("--lines", action="store", type="int", metavar="N",
+        help="If there is no offset file, start N lines before the end of the log file.")
+    cmdline.add_option("--since", action="store", metavar="WHEN",
+        help="If there is no offset file, start at the first line logged at or after WHEN"
+             " (YYYY-MM-DD HH:MM[:SS], or HH:MM[:SS] for today).")
+    cmdline.add_option("--timestamp-regex", action="store", metavar="PATTERN",
+        help="With --since, regular expression matching the timestamp in each line (the"
+             " 'timestamp' group or first group, if any); default: ISO 8601 or common log format.")
+    cmdline.add_option("--timestamp-format", action="store", default="%Y-%m-%d %H:%M:%S",
+        help="With --timestamp-regex, strptime format of the timestamps (default: %default).")
     cmdline.add_option("--log-pattern", action="append",
         help="Custom log rotation glob pattern. Use %s to represent the original filename."
              " You may use this multiple times to provide multiple patterns.")
@@ -393,6 +2399,23 @@ def main():
                        help="Only log when line ends in a newline (\\n)")
     cmdline.add_option("--encoding", action="store",
         help="Encoding to use for reading files (default: system encoding)")
+    cmdline.add_option("--binary", action="store_true",
+        help="Read and write raw bytes, without decoding or newline translation.")
+    cmdline.add_option("--follow", "-f", action="store_true",
+        help="Keep waiting for new lines, following the log file across rotations.")
+    cmdline.add_option("--prefetch", action="store", type="int", default=0,
+        help="Read up to this many 1 MiB blocks ahead in a background thread.")
+    cmdline.add_option("--grep", action="store", metavar="PATTERN",
+        help="Only print lines matching this regular expression.")
+    cmdline.add_option("--grep-v", action="store", metavar="PATTERN",
+        help="Don't print lines matching this regular expression.")
+    cmdline.add_option("--stats", action="store_true",
+        help="Write a JSON summary of what was read, with timings, to stderr at exit.")
+    cmdline.add_option("--status", action="store_true",
+        help="Instead of reading them, report how much of each of the given logfiles"
+             " (or globs) is unread and for how long it has been waiting.")
+    cmdline.add_option("--json", action="store_true",
+        help="With --status, print the report as JSON.")
     cmdline.add_option("--version", action="store_true",
         help="Print version and exit.")
 
@@ -402,23 +2425,98 @@ def main():
         print("pygtail version", __version__)
         sys.exit(0)
 
+    if options.status:
+        if not args:
+            cmdline.error("Please provide the logfiles to report on.")
+        kwargs = {'copytruncate': not options.no_copytruncate,
+                  'log_patterns': options.log_pattern}
+        if options.offset_file and is_offset_store_spec(options.offset_file):
+            kwargs['offset_store'] = open_offset_store(options.offset_file)
+        elif options.offset_file:
+            if len(args) > 1 or glob.has_magic(args[0]):
+                cmdline.error("--offset-file can only name a shared offset store with several logfiles.")
+            kwargs['offset_file'] = options.offset_file
+        rows = _status(args, **kwargs)
+        if options.json:
+            sys.stdout.write(json.dumps(rows, sort_keys=True) + "\n")
+        else:
+            sys.stdout.write(_format_status(rows))
+        sys.exit(0)
+
     if (len(args) != 1):
         cmdline.error("Please provide a logfile to read.")
 
+    since = timestamp_parser = None
+    if options.since:
+        try:
+            since = _parse_since(options.since)
+        except ValueError:
+            cmdline.error("Can't parse --since %r." % options.since)
+        if options.timestamp_regex:
+            timestamp_parser = regex_timestamp_parser(options.timestamp_regex,
+                                                      options.timestamp_format)
+
     if options.every_n:
         options.every_n = int(options.every_n)
+    offset_file, offset_store = options.offset_file, None
+    if offset_file and is_offset_store_spec(offset_file):
+        offset_file, offset_store = None, open_offset_store(offset_file)
     pygtail = Pygtail(args[0],
-                      offset_file=options.offset_file,
+                      offset_file=offset_file,
+                      offset_store=offset_store,
                       paranoid=options.paranoid,
                       every_n=options.every_n,
+                      checkpoint_interval=options.checkpoint_interval,
+                      checkpoint_bytes=options.checkpoint_bytes,
                       copytruncate=not options.no_copytruncate,
                       read_from_end=options.read_from_end,
+                      start_lines=options.lines,
+                      since=since,
+                      timestamp_parser=timestamp_parser,
                       log_patterns=options.log_pattern,
                       full_lines=options.full_lines,
-                      encoding=options.encoding)
+                      encoding=options.encoding,
+                      binary=options.binary,
+                      follow=options.follow,
+                      prefetch=options.prefetch,
+                      include=options.grep,
+                      exclude=options.grep_v,
+                      timing=options.stats)
 
-    for line in pygtail:
-        sys.stdout.write(line)
+    if options.binary and PY3:
+        stdout = sys.stdout.buffer
+    else:
+        stdout = sys.stdout
+    # with raw bytes wanted, and nothing to filter, trim, checkpoint or count
+    # along the way, the unread bytes can be copied straight to stdout
+    out_fd = None
+    if options.binary and not (options.follow or options.full_lines or options.grep or
+                               options.grep_v or options.paranoid or options.every_n or
+                               options.checkpoint_interval or options.checkpoint_bytes or
+                               options.stats):
+        try:
+            out_fd = sys.stdout.fileno()
+        except (AttributeError, IOError, ValueError):
+            # not a real file, e.g. replaced by a test
+            pass
+    try:
+        if out_fd is not None:
+            sys.stdout.flush()
+            pygtail._copy_to_fd(out_fd)
+        elif options.follow:
+            try:
+                for batch in pygtail.read_batches():
+                    stdout.writelines(batch)
+                    stdout.flush()
+            except KeyboardInterrupt:
+                pass
+        else:
+            for line in pygtail:
+                stdout.write(line)
+    finally:
+        if options.stats:
+            sys.stderr.write(json.dumps(pygtail.stats(), sort_keys=True) + "\n")
+    pygtail.offset_store.close()
 
 
 if __name__ == "__main__":
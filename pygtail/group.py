@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""Tailing many log files from a single process."""
+
+import errno
+import glob
+import os
+import time
+from collections import OrderedDict
+
+from pygtail.core import (BOOKKEEPING_SUFFIXES, DEFAULT_BATCH_BYTES, FOLLOW_POLL_MAX, FOLLOW_POLL_MIN,
+                          Pygtail, text_type)
+from pygtail.offsets import FileOffsetStore
+
+# default maximum number of log files kept open at once by a PygtailGroup
+DEFAULT_MAX_OPEN = 256
+
+
+class _Member(object):
+    """A file in a PygtailGroup, with its size and inode when last read."""
+
+    __slots__ = ('tail', 'inode', 'size')
+
+    def __init__(self):
+        self.tail = None
+        self.inode = None
+        self.size = None
+
+
+class PygtailGroup(object):
+    """
+    Tails every log file matching a list of paths or glob patterns, picking
+    up new files as they appear.
+
+    Iterating yields `(filename, line)` pairs, and `read_batches()` yields
+    `(filename, lines)`. Files with unread data are read in turn, one block of
+    up to `max_bytes` each, so a busy file can't starve the others. A file
+    that hasn't changed since it was last read costs a single stat() per pass,
+    and at most `max_open` files are kept open, the least recently read being
+    closed first. With `follow=True`, the files are polled for more data
+    instead of stopping once they're all read.
+
+    Other keyword arguments are passed on to each file's `Pygtail`. Offsets
+    are stored in the default `<logfile>.offset` files (which are never
+    tailed themselves), or in `offset_store` if one is given, in which case
+    the offsets saved during each pass over the files are committed together.
+    """
+
+    def __init__(self, patterns, max_open=DEFAULT_MAX_OPEN, max_bytes=DEFAULT_BATCH_BYTES,
+                 follow=False, **kwargs):
+        if 'offset_file' in kwargs:
+            raise ValueError("each file in a PygtailGroup needs its own offset file")
+        if isinstance(patterns, (str, text_type)):
+            patterns = [patterns]
+        self.patterns = list(patterns)
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.follow = follow
+        self._kwargs = kwargs
+        self._members = {}
+        self._open = OrderedDict()
+
+    def __iter__(self):
+        for filename, lines in self.read_batches():
+            for line in lines:
+                yield filename, line
+
+    def read_batches(self):
+        """
+        Generator yielding `(filename, lines)` for unread lines in all files.
+        """
+        offset_store = self._kwargs.get('offset_store') or FileOffsetStore()
+        interval = FOLLOW_POLL_MIN
+        while True:
+            active = self._changed_files()
+            if active:
+                interval = FOLLOW_POLL_MIN
+            with offset_store.batch():
+                while active:
+                    still_active = []
+                    for filename in active:
+                        lines = self._read_block(filename)
+                        if lines is not None:
+                            still_active.append(filename)
+                            yield filename, lines
+                    active = still_active
+            if not self.follow:
+                return
+            time.sleep(interval)
+            interval = min(interval * 2, FOLLOW_POLL_MAX)
+
+    def close(self):
+        """Close all open files."""
+        while self._open:
+            self._open.popitem()[1].close()
+
+    def _discover(self):
+        """Return the files currently matching our patterns."""
+        filenames = set()
+        for pattern in self.patterns:
+            filenames.update(glob.glob(pattern))
+        return set(filename for filename in filenames if not filename.endswith(BOOKKEEPING_SUFFIXES))
+
+    def _changed_files(self):
+        """
+        Look for new files, forget about deleted ones, and return the ones
+        which have changed since we last read them.
+        """
+        filenames = self._discover()
+        for filename in set(self._members) - filenames:
+            self._forget(filename)
+
+        changed = []
+        for filename in sorted(filenames):
+            try:
+                st = os.stat(filename)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            member = self._members.get(filename)
+            if member is None:
+                member = self._members[filename] = _Member()
+            if (st.st_ino, st.st_size) != (member.inode, member.size):
+                changed.append(filename)
+        return changed
+
+    def _read_block(self, filename):
+        """
+        Read the next block of lines from `filename`, or return None (noting
+        the size it was read up to) if there are none.
+        """
+        member = self._members[filename]
+        if member.tail is None:
+            member.tail = Pygtail(filename, **self._kwargs)
+
+        if filename in self._open:
+            # most recently used last
+            self._open[filename] = self._open.pop(filename)
+        else:
+            self._open[filename] = member.tail
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)[1].close()
+
+        lines = member.tail._next_block(self.max_bytes)
+        if lines is None:
+            fh = member.tail.fh
+            member.inode = member.tail._fh_inode
+            member.size = os.fstat(fh.fileno()).st_size
+        return lines
+
+    def _forget(self, filename):
+        member = self._members.pop(filename)
+        if self._open.pop(filename, None) is not None:
+            member.tail.close()
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Seekable reading of gzip files through an index of access points, after
+zlib's examples/zran.c.
+
+An access point records where a deflate block starts, in the compressed and
+the uncompressed data, with the 32 KiB of output before it, which is all
+inflate needs to start decompressing there. Points are recorded about every
+`GZIP_INDEX_SPAN` bytes of output as a file is read, and the index is saved
+so that a later seek jumps to the nearest point instead of decompressing the
+file from the start. Points are appended to the saved index as they are
+added, so it can be saved as often as offsets are. This needs libz, which is loaded with ctypes, since the
+zlib module can't stop at block boundaries.
+"""
+
+import ctypes
+import ctypes.util
+import gzip
+import io
+import os
+import struct
+import zlib
+from bisect import bisect_right
+from os import fstat
+from os.path import exists
+
+from pygtail.offsets import _write_atomically
+
+# uncompressed bytes between access points
+GZIP_INDEX_SPAN = 1024 * 1024
+
+# deflate's maximum back-reference distance
+WINDOW_SIZE = 32768
+
+# bytes of compressed input read at a time
+INPUT_CHUNK_BYTES = 64 * 1024
+
+# largest single call to inflate
+OUTPUT_CHUNK_BYTES = 256 * 1024
+
+# window bits for a gzip header and trailer, and for raw deflate data
+GZIP_WBITS = 16 + 15
+RAW_WBITS = -15
+
+_INDEX_MAGIC = b"PYGTGZI2"
+_INDEX_HEADER = struct.Struct("<8sQQdQ")
+_POINT_HEADER = struct.Struct("<QQBI")
+
+Z_BLOCK = 5
+Z_OK = 0
+Z_STREAM_END = 1
+Z_BUF_ERROR = -5
+
+
+class _ZStream(ctypes.Structure):
+    _fields_ = [
+        ('next_in', ctypes.c_void_p),
+        ('avail_in', ctypes.c_uint),
+        ('total_in', ctypes.c_ulong),
+        ('next_out', ctypes.c_void_p),
+        ('avail_out', ctypes.c_uint),
+        ('total_out', ctypes.c_ulong),
+        ('msg', ctypes.c_char_p),
+        ('state', ctypes.c_void_p),
+        ('zalloc', ctypes.c_void_p),
+        ('zfree', ctypes.c_void_p),
+        ('opaque', ctypes.c_void_p),
+        ('data_type', ctypes.c_int),
+        ('adler', ctypes.c_ulong),
+        ('reserved', ctypes.c_ulong),
+    ]
+
+
+_libz = None
+
+
+def _load_libz():
+    """Return libz, or None if it can't be loaded."""
+    global _libz
+    if _libz is None:
+        _libz = False
+        name = ctypes.util.find_library('z')
+        if name:
+            try:
+                libz = ctypes.CDLL(name)
+                libz.zlibVersion.restype = ctypes.c_char_p
+                libz.inflatePrime
+            except (OSError, AttributeError):
+                pass
+            else:
+                _libz = libz
+    return _libz or None
+
+
+class _Inflater(object):
+    """A zlib inflate stream."""
+
+    def __init__(self, libz, wbits):
+        self._libz = libz
+        self._strm = _ZStream()
+        self._input = None
+        ret = libz.inflateInit2_(ctypes.byref(self._strm), wbits, libz.zlibVersion(),
+                                 ctypes.sizeof(self._strm))
+        if ret != Z_OK:
+            raise IOError("inflateInit2 failed (%d)" % ret)
+
+    @property
+    def avail_in(self):
+        return self._strm.avail_in
+
+    @property
+    def data_type(self):
+        return self._strm.data_type
+
+    def feed(self, data):
+        """Give the stream more input; any unconsumed input is dropped."""
+        self._input = ctypes.create_string_buffer(data, len(data))
+        self._strm.next_in = ctypes.addressof(self._input)
+        self._strm.avail_in = len(data)
+
+    def unconsumed(self):
+        """Take back the input not consumed yet."""
+        data = ctypes.string_at(self._strm.next_in, self._strm.avail_in) if self._strm.avail_in else b''
+        self._strm.avail_in = 0
+        return data
+
+    def prime(self, bits, value):
+        self._check(self._libz.inflatePrime(ctypes.byref(self._strm), bits, value))
+
+    def set_dictionary(self, window):
+        if window:
+            self._check(self._libz.inflateSetDictionary(ctypes.byref(self._strm), window, len(window)))
+
+    def inflate(self, out, size, flush):
+        """Inflate into `out`, returning the zlib status and the output."""
+        self._strm.next_out = ctypes.addressof(out)
+        self._strm.avail_out = size
+        ret = self._libz.inflate(ctypes.byref(self._strm), flush)
+        if ret not in (Z_OK, Z_STREAM_END, Z_BUF_ERROR):
+            raise IOError("invalid gzip data (%s)" % (self._strm.msg or ret))
+        return ret, ctypes.string_at(out, size - self._strm.avail_out)
+
+    def close(self):
+        if self._strm is not None:
+            self._libz.inflateEnd(ctypes.byref(self._strm))
+            self._strm = None
+
+    def _check(self, ret):
+        if ret != Z_OK:
+            raise IOError("invalid gzip index (%d)" % ret)
+
+
+class _AccessPoint(object):
+    __slots__ = ('out', 'in_', 'bits', 'window')
+
+    def __init__(self, out, in_, bits, window):
+        self.out = out
+        self.in_ = in_
+        self.bits = bits
+        self.window = window
+
+
+class GzipIndex(object):
+    """
+    The access points of one gzip file, identified by its inode, size and
+    modification time, in order of uncompressed position.
+    """
+
+    def __init__(self, inode, size, mtime, span=GZIP_INDEX_SPAN):
+        self.inode = inode
+        self.size = size
+        self.mtime = mtime
+        self.span = span
+        self.points = []
+        self._outs = []
+        # how many points the saved index holds, if it can be appended to
+        self._saved = None
+
+    def add(self, point):
+        self.points.append(point)
+        self._outs.append(point.out)
+
+    def find(self, offset):
+        """Return the last access point at or before `offset`, or None."""
+        i = bisect_right(self._outs, offset)
+        return self.points[i - 1] if i else None
+
+    def next_point_at(self):
+        """Return the uncompressed position after which to add a point."""
+        return (self._outs[-1] if self._outs else 0) + self.span
+
+    def save(self, path):
+        """
+        Save the index to `path`, in full the first time and after that by
+        appending only the points added since.
+        """
+        # points may be added by the decompressing thread meanwhile
+        points = self.points[:]
+        if self._saved is None:
+            header = _INDEX_HEADER.pack(_INDEX_MAGIC, self.inode, self.size, self.mtime, self.span)
+            _write_atomically(path, header + b''.join(_pack_point(point) for point in points))
+        elif len(points) > self._saved:
+            with open(path, 'ab') as fh:
+                fh.write(b''.join(_pack_point(point) for point in points[self._saved:]))
+                fh.flush()
+                os.fsync(fh.fileno())
+        self._saved = len(points)
+
+    @classmethod
+    def load(cls, path, inode, size, mtime):
+        """
+        Return the index saved at `path` if it's for the file with the given
+        inode, size and mtime, or None.
+        """
+        if not exists(path):
+            return None
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        try:
+            magic, saved_inode, saved_size, saved_mtime, span = _INDEX_HEADER.unpack_from(data, 0)
+        except struct.error:
+            return None
+        if magic != _INDEX_MAGIC or (saved_inode, saved_size, saved_mtime) != (inode, size, mtime):
+            # stale; it will be rebuilt
+            return None
+        index = cls(inode, size, mtime, span)
+        pos = _INDEX_HEADER.size
+        try:
+            while pos < len(data):
+                out, in_, bits, length = _POINT_HEADER.unpack_from(data, pos)
+                pos += _POINT_HEADER.size
+                index.add(_AccessPoint(out, in_, bits, zlib.decompress(data[pos:pos + length])))
+                pos += length
+            index._saved = len(index.points)
+        except (struct.error, zlib.error):
+            # the last point was torn while being appended; the index will be
+            # saved afresh without it
+            pass
+        return index
+
+
+def _pack_point(point):
+    window = zlib.compress(point.window)
+    return _POINT_HEADER.pack(point.out, point.in_, point.bits, len(window)) + window
+
+
+class IndexedGzipReader(io.RawIOBase):
+    """
+    Raw reader of the uncompressed contents of the gzip file open as `fileobj`,
+    which seeks using (and adds to) the index saved at `index_path`. The
+    index is saved, if it gained points, by `save_index()` and on closing;
+    `fileobj` is left open.
+    """
+
+    def __init__(self, fileobj, index_path, libz=None):
+        io.RawIOBase.__init__(self)
+        self.index_path = index_path
+        self._libz = libz or _load_libz()
+        self._fh = fileobj
+        st = fstat(self._fh.fileno())
+        self._index = GzipIndex.load(index_path, st.st_ino, st.st_size, st.st_mtime) or \
+            GzipIndex(st.st_ino, st.st_size, st.st_mtime)
+        self._dirty = False
+        self._out = ctypes.create_string_buffer(OUTPUT_CHUNK_BYTES)
+        self._inflater = None
+        self._start(None)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._fh.fileno()
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET:
+            raise ValueError("Seek from end not supported")
+        point = self._index.find(offset)
+        if offset < self._pos or (point is not None and point.out > self._pos):
+            self._start(point)
+        while self._pos < offset:
+            if not self._inflate(min(offset - self._pos, OUTPUT_CHUNK_BYTES)):
+                break
+        return self._pos
+
+    def readinto(self, b):
+        data = self._inflate(min(len(b), OUTPUT_CHUNK_BYTES))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.save_index()
+        finally:
+            self._inflater.close()
+            io.RawIOBase.close(self)
+
+    def save_index(self):
+        """Save the index if it has gained points since it was last saved."""
+        if self._dirty:
+            self._dirty = False
+            self._index.save(self.index_path)
+
+    def _start(self, point):
+        """Get ready to decompress from `point`, or from the start if None."""
+        if self._inflater is not None:
+            self._inflater.close()
+        self._eof = False
+        if point is None:
+            self._inflater = _Inflater(self._libz, GZIP_WBITS)
+            self._raw = False
+            self._in_pos = 0
+            self._pos = 0
+            self._window = b''
+        else:
+            self._inflater = _Inflater(self._libz, RAW_WBITS)
+            self._raw = True
+            self._in_pos = point.in_
+            if point.bits:
+                self._fh.seek(point.in_ - 1)
+                self._inflater.prime(point.bits, ord(self._fh.read(1)) >> (8 - point.bits))
+            self._inflater.set_dictionary(point.window)
+            self._pos = point.out
+            self._window = point.window
+        self._fh.seek(self._in_pos)
+
+    def _inflate(self, size):
+        """Decompress and return up to `size` bytes, or b'' at the end."""
+        while not self._eof:
+            inflater = self._inflater
+            if not inflater.avail_in:
+                data = self._fh.read(INPUT_CHUNK_BYTES)
+                if not data:
+                    raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+                inflater.feed(data)
+                self._in_pos += len(data)
+            ret, data = inflater.inflate(self._out, size, Z_BLOCK)
+            self._pos += len(data)
+            self._track(data)
+            if ret == Z_STREAM_END:
+                self._next_member()
+            if data:
+                return data
+        return b''
+
+    def _track(self, data):
+        """
+        Keep the window of output needed for the next access point, and add
+        the point at the first block boundary once we get there.
+        """
+        next_point_at = self._index.next_point_at()
+        if self._pos <= next_point_at - WINDOW_SIZE:
+            return
+        self._window = (self._window + data)[-WINDOW_SIZE:]
+        data_type = self._inflater.data_type
+        if self._pos >= next_point_at and data_type & 128 and not data_type & 64:
+            self._index.add(_AccessPoint(self._pos, self._in_pos - self._inflater.avail_in,
+                                         data_type & 7, self._window))
+            self._dirty = True
+
+    def _next_member(self):
+        """Move on to the next member of a multi-member file, if any."""
+        rest = self._inflater.unconsumed()
+        if self._raw:
+            # skip the trailer (CRC and size), which raw inflate leaves alone
+            while len(rest) < 8:
+                data = self._fh.read(INPUT_CHUNK_BYTES)
+                if not data:
+                    break
+                self._in_pos += len(data)
+                rest += data
+            rest = rest[8:]
+        if not rest.lstrip(b'\x00'):
+            rest = self._fh.read(INPUT_CHUNK_BYTES)
+            self._in_pos += len(rest)
+            if not rest.lstrip(b'\x00'):
+                self._eof = True
+                return
+        self._inflater.close()
+        self._inflater = _Inflater(self._libz, GZIP_WBITS)
+        self._raw = False
+        self._window = b''
+        self._inflater.feed(rest)
+
+
+def open_gzip(fileobj, index_path=None):
+    """
+    Return a reader of the uncompressed contents of the gzip file open as
+    `fileobj`, seeking through an index saved at `index_path` if one is given
+    and libz is available, or else with the gzip module.
+    """
+    libz = _load_libz()
+    if index_path is None or libz is None:
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    return io.BufferedReader(IndexedGzipReader(fileobj, index_path, libz))
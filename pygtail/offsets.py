@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+# pygtail - a python "port" of logtail2
+# Copyright (C) 2011 Brad Greenlee <brad@footle.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""Places to keep the offsets of tailed files."""
+
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from os.path import exists, getmtime, getsize
+
+# atomic even if the destination exists (os.rename is, on POSIX)
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _write_atomically(path, data):
+    """
+    Replace the contents of `path` with `data` via a temporary file, so that
+    a crash leaves either the old or the new contents, never a partial file.
+    """
+    tmp_path = "%s.tmp" % path
+    with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    _replace(tmp_path, path)
+
+
+class OffsetStore(object):
+    """
+    Base class for offset stores, which map a key (an offset file name, or a
+    log file name for shared stores) to the inode and offset of the log file.
+
+    Saves are durable when `save()` returns, except inside a `batch()`, where
+    they may be deferred until the batch ends so that many offsets can be
+    committed at once.
+    """
+
+    def __init__(self):
+        self._batch_depth = 0
+
+    def load(self, key):
+        """Return the saved `(inode, offset)` for `key`, or None."""
+        raise NotImplementedError
+
+    def save(self, key, inode, offset):
+        """Save the inode and offset for `key`."""
+        raise NotImplementedError
+
+    def saved_at(self, key):
+        """
+        Return the time at which the offset for `key` was last saved, as a
+        timestamp, or None if unknown.
+        """
+        return None
+
+    def flush(self):
+        """Make any deferred saves durable."""
+
+    def close(self):
+        self.flush()
+
+    @contextmanager
+    def batch(self):
+        """Context manager deferring durability of saves until it exits."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FileOffsetStore(OffsetStore):
+    """
+    The original offset format: one small file per log, named by the key,
+    holding the inode and offset on separate lines. Files are replaced
+    atomically, and one that can't be parsed is ignored with a warning.
+    """
+
+    def load(self, key):
+        if not exists(key) or not getsize(key):
+            return None
+        with open(key, "r") as fh:
+            try:
+                inode, offset = [int(line.strip()) for line in fh]
+            except ValueError:
+                sys.stderr.write("[pygtail] [WARN] ignoring corrupt offset file %s.\n" % key)
+                return None
+        return inode, offset
+
+    def save(self, key, inode, offset):
+        _write_atomically(key, "%s\n%s\n" % (inode, offset))
+
+    def saved_at(self, key):
+        return getmtime(key) if exists(key) else None
+
+
+class JournalOffsetStore(OffsetStore):
+    """
+    Offsets for many logs in a single append-only journal file. Each save
+    appends an `<inode> <offset> @<time saved> <key>` line, the last one for a
+    key winning, and the journal is rewritten without the stale lines once
+    they outnumber the live ones `compact_ratio` to one. Only one process
+    should use a given journal at a time.
+    """
+
+    def __init__(self, path, compact_ratio=4, compact_min=1024):
+        OffsetStore.__init__(self)
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._offsets = {}
+        self._saved_at = {}
+        self._records = 0
+        self._unsynced = False
+        if exists(path):
+            with open(path, "r") as fh:
+                for line in fh:
+                    if not line.endswith("\n"):
+                        # torn write at the end of the journal
+                        continue
+                    record = _parse_journal_line(line[:-1])
+                    if record is None:
+                        continue
+                    key, inode, offset, saved_at = record
+                    self._offsets[key] = (inode, offset)
+                    self._saved_at[key] = saved_at
+                    self._records += 1
+        self._fh = open(path, "a")
+
+    def load(self, key):
+        return self._offsets.get(key)
+
+    def saved_at(self, key):
+        return self._saved_at.get(key)
+
+    def save(self, key, inode, offset):
+        if "\n" in key:
+            raise ValueError("journal keys can't contain newlines")
+        self._offsets[key] = (inode, offset)
+        self._saved_at[key] = saved_at = time.time()
+        self._fh.write(_journal_line(key, inode, offset, saved_at))
+        self._records += 1
+        self._unsynced = True
+        if self._records > max(self.compact_min, self.compact_ratio * len(self._offsets)):
+            self.compact()
+        elif not self._batch_depth:
+            self.flush()
+
+    def flush(self):
+        if self._unsynced and not self._fh.closed:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._unsynced = False
+
+    def compact(self):
+        """Rewrite the journal with only the latest offset for each key."""
+        self._fh.close()
+        _write_atomically(self.path, "".join(
+            _journal_line(key, inode, offset, self._saved_at.get(key))
+            for key, (inode, offset) in self._offsets.items()))
+        self._fh = open(self.path, "a")
+        self._records = len(self._offsets)
+        self._unsynced = False
+
+    def close(self):
+        if not self._fh.closed:
+            self.flush()
+            self._fh.close()
+
+
+def _journal_line(key, inode, offset, saved_at):
+    if saved_at is None:
+        return "%d %d %s\n" % (inode, offset, key)
+    return "%d %d @%.6f %s\n" % (inode, offset, saved_at, key)
+
+
+def _parse_journal_line(line):
+    """
+    Return `(key, inode, offset, saved_at)` from a journal line, without its
+    newline, or None if it's malformed. Lines written before save times were
+    recorded have no `@<time saved>` field, and a None `saved_at`.
+    """
+    fields = line.split(" ", 2)
+    if len(fields) != 3:
+        return None
+    try:
+        inode, offset = int(fields[0]), int(fields[1])
+    except ValueError:
+        return None
+    key, saved_at = fields[2], None
+    stamp, _, rest = key.partition(" ")
+    if stamp.startswith("@") and rest:
+        try:
+            saved_at, key = float(stamp[1:]), rest
+        except ValueError:
+            # the key of an older line, starting with "@"
+            pass
+    return key, inode, offset, saved_at
+
+
+class SQLiteOffsetStore(OffsetStore):
+    """
+    Offsets for many logs in an SQLite database in WAL mode. Each save outside
+    a `batch()` is committed on its own; inside one, all saves are committed
+    in a single transaction when the batch ends. The log is synced on every
+    commit (`synchronous=FULL`), so commits survive a power failure.
+    """
+
+    def __init__(self, path):
+        OffsetStore.__init__(self)
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS offsets "
+                           "(key TEXT PRIMARY KEY, inode INTEGER, offset INTEGER, saved_at REAL)")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(offsets)")]
+        if "saved_at" not in columns:
+            # created before save times were recorded
+            self._conn.execute("ALTER TABLE offsets ADD COLUMN saved_at REAL")
+        self._in_transaction = False
+
+    def load(self, key):
+        row = self._conn.execute("SELECT inode, offset FROM offsets WHERE key = ?", (key,)).fetchone()
+        return tuple(row) if row else None
+
+    def saved_at(self, key):
+        row = self._conn.execute("SELECT saved_at FROM offsets WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, key, inode, offset):
+        if self._batch_depth and not self._in_transaction:
+            self._conn.execute("BEGIN")
+            self._in_transaction = True
+        self._conn.execute("INSERT OR REPLACE INTO offsets (key, inode, offset, saved_at) "
+                           "VALUES (?, ?, ?, ?)", (key, inode, offset, time.time()))
+
+    def flush(self):
+        if self._in_transaction:
+            self._conn.execute("COMMIT")
+            self._in_transaction = False
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def open_offset_store(spec):
+    """
+    Open the shared offset store described by `spec`, which is either
+    `sqlite:PATH` or `journal:PATH`.
+    """
+    scheme, _, path = spec.partition(":")
+    if scheme == "sqlite":
+        return SQLiteOffsetStore(path)
+    elif scheme == "journal":
+        return JournalOffsetStore(path)
+    raise ValueError("unknown offset store: %s" % spec)
+
+
+def is_offset_store_spec(spec):
+    """Return whether `spec` names a shared offset store rather than a file."""
+    return spec.startswith(("sqlite:", "journal:"))
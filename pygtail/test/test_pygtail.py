@@ -6,12 +6,39 @@ try:
     import unittest2 as unittest
 except ImportError:
     import unittest
+import bz2
+import datetime
+import glob
+import re
 import shutil
 import tempfile
 import gzip
 import io
+import json
+import threading
+import time
 
-from pygtail import Pygtail
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    from concurrent import futures
+except ImportError:
+    # python 2, without the futures backport
+    futures = None
+
+from pygtail import core, offsets
+from pygtail import (JournalOffsetStore, JSONLinesExtractor, Pygtail, PygtailGroup, RegexExtractor,
+                     SQLiteOffsetStore)
+from pygtail.benchmarks import generate_log, rotate, run_benchmarks
+from pygtail.core import _PollWatcher, _RangeCopier, _find_last_lines, _status, regex_timestamp_parser
 
 
 PY2 = sys.version_info[0] == 2
@@ -40,9 +67,17 @@ class PygtailTest(unittest.TestCase):
         fh = open(self.logfile.name, "w")
         fh.close()
 
+    def later(self, func, *args):
+        # run func in the background shortly, e.g. while we're blocked following the log
+        timer = threading.Timer(0.2, func, args)
+        timer.start()
+        self.addCleanup(timer.join)
+
     def tearDown(self):
         filename = self.logfile.name
-        for tmpfile in [filename, filename + ".offset", filename + ".1", filename + ".1.gz"]:
+        for tmpfile in [filename, filename + ".offset", filename + ".1", filename + ".1.gz",
+                        filename + ".2", filename + ".2.gz",
+                        filename + ".1.bz2", filename + ".old"] + glob.glob(filename + ".offset.*.gzidx"):
             if os.path.exists(tmpfile):
                 os.remove(tmpfile)
 
@@ -75,6 +110,33 @@ class PygtailTest(unittest.TestCase):
         new_pygtail = Pygtail(self.logfile.name, read_from_end=True)
         self.assertEqual(new_pygtail.read(), new_lines)
 
+    def test_read_max_bytes(self):
+        self.append("4444444\n5\n6")
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(pygtail.read(max_bytes=5), "1\n2\n")
+        self.assertEqual(pygtail.read(max_bytes=5), "3\n")
+        # a line longer than max_bytes is read whole
+        self.assertEqual(pygtail.read(max_bytes=5), "4444444\n")
+        self.assertEqual(pygtail.read(max_bytes=5), "5\n6")
+        self.assertEqual(pygtail.read(max_bytes=5), None)
+
+    def test_read_max_bytes_resumes_at_line_boundary(self):
+        self.assertEqual(Pygtail(self.logfile.name).read(max_bytes=5), "1\n2\n")
+        self.assertEqual(Pygtail(self.logfile.name).read(max_bytes=5), "3\n")
+        self.assertEqual(Pygtail(self.logfile.name).read(max_bytes=5), None)
+
+    def test_copy_to(self):
+        out = io.StringIO()
+        self.assertEqual(Pygtail(self.logfile.name).copy_to(out, chunk_size=2), 6)
+        self.assertEqual(out.getvalue(), self.test_str)
+        self.append("4\n5\n")
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append("6\n")
+        out = io.BytesIO()
+        Pygtail(self.logfile.name, binary=True).copy_to(out)
+        self.assertEqual(out.getvalue(), b"4\n5\n6\n")
+        self.assertEqual(Pygtail(self.logfile.name).read(), None)
+
     def test_logrotate_without_delay_compress(self):
         new_lines = ["4\n5\n", "6\n7\n"]
         pygtail = Pygtail(self.logfile.name)
@@ -95,6 +157,95 @@ class PygtailTest(unittest.TestCase):
         pygtail = Pygtail(self.logfile.name)
         self.assertEqual(pygtail.read(), ''.join(new_lines))
 
+    def test_logrotate_compressed_resume_with_index(self):
+        pygtail = Pygtail(self.logfile.name)
+        pygtail.read()
+        new_lines = ["%d %s\n" % (i, hex(i * 2654435761 % 4294967296)) for i in range(200000)]
+        self.append(''.join(new_lines))
+        with open(self.logfile.name, 'rb') as logfile:
+            with gzip.open("%s.1.gz" % self.logfile.name, 'wb') as gzip_handle:
+                gzip_handle.write(logfile.read())
+        with open(self.logfile.name, 'w'):
+            pass
+
+        # read part of the rotated file, then stop
+        pygtail = Pygtail(self.logfile.name, every_n=50000)
+        for _ in range(150001):
+            next(pygtail)
+        pygtail.close()
+        index = "%s.offset.%d.gzidx" % (self.logfile.name, os.stat("%s.1.gz" % self.logfile.name).st_ino)
+        self.assertTrue(os.path.exists(index))
+
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(pygtail.read(), ''.join(new_lines[150000:]))
+        self.assertFalse(os.path.exists(index))
+
+    def test_logrotate_compressed_index_saved_on_checkpoint(self):
+        Pygtail(self.logfile.name).read()
+        new_lines = ["%d %s\n" % (i, hex(i * 2654435761 % 4294967296)) for i in range(800000)]
+        self.append(''.join(new_lines))
+        with open(self.logfile.name, 'rb') as logfile:
+            with gzip.open("%s.1.gz" % self.logfile.name, 'wb') as gzip_handle:
+                gzip_handle.write(logfile.read())
+        with open(self.logfile.name, 'w'):
+            pass
+        index = "%s.offset.%d.gzidx" % (self.logfile.name, os.stat("%s.1.gz" % self.logfile.name).st_ino)
+
+        # killed part way through, well before the end has been decompressed:
+        # the index is saved with the offset, not on closing
+        pygtail = Pygtail(self.logfile.name, every_n=50000)
+        self.addCleanup(pygtail.close)
+        for _ in range(150001):
+            next(pygtail)
+        self.assertTrue(os.path.exists(index))
+
+        # a point torn while being appended is dropped
+        with open(index, 'ab') as fh:
+            fh.write(b'\0' * 10)
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(pygtail.read(), ''.join(new_lines[150000:]))
+
+    def _test_logrotate_compressed(self, rotated_filename, compressed_open, **kwargs):
+        new_lines = ["4\n5\n", "6\n7\n"]
+        pygtail = Pygtail(self.logfile.name, **kwargs)
+        pygtail.read()
+        self.append(new_lines[0])
+        with open(self.logfile.name, 'rb') as logfile:
+            with compressed_open(rotated_filename, 'wb') as compressed:
+                compressed.write(logfile.read())
+        with open(self.logfile.name, 'w'):
+            pass
+        self.append(new_lines[1])
+        pygtail = Pygtail(self.logfile.name, **kwargs)
+        self.assertEqual(pygtail.read(), ''.join(new_lines))
+
+    def test_logrotate_compressed_text(self):
+        Pygtail(self.logfile.name).read()
+        self.append("4\n5\n")
+        with open(self.logfile.name, 'rb') as logfile:
+            with gzip.open("%s.1.gz" % self.logfile.name, 'wb') as dst:
+                dst.write(logfile.read())
+        with open(self.logfile.name, 'w'):
+            pass
+        self.append("6\n")
+        lines = Pygtail(self.logfile.name, save_on_end=False).readlines()
+        self.assertEqual(lines, ["4\n", "5\n", "6\n"])
+        self.assertTrue(all(isinstance(line, core.text_type) for line in lines))
+        batches = list(Pygtail(self.logfile.name, save_on_end=False, full_lines=True).read_batches())
+        self.assertEqual(batches, [["4\n", "5\n"], ["6\n"]])
+        self.assertTrue(all(isinstance(line, core.text_type) for batch in batches for line in batch))
+        out = io.StringIO()
+        Pygtail(self.logfile.name).copy_to(out)
+        self.assertEqual(out.getvalue(), "4\n5\n6\n")
+
+    def test_logrotate_bz2(self):
+        self._test_logrotate_compressed("%s.1.bz2" % self.logfile.name, bz2.BZ2File)
+
+    @unittest.skipIf(lzma is None, "needs lzma")
+    def test_logrotate_compressed_recognised_by_contents(self):
+        self._test_logrotate_compressed("%s.old" % self.logfile.name, lzma.open,
+                                        log_patterns=["%s.old"])
+
     def test_logrotate_with_delay_compress(self):
         new_lines = ["4\n5\n", "6\n7\n"]
         pygtail = Pygtail(self.logfile.name)
@@ -115,6 +266,76 @@ class PygtailTest(unittest.TestCase):
         pygtail = Pygtail(self.logfile.name)
         self.assertEqual(pygtail.read(), ''.join(new_lines))
 
+    def test_logrotate_picks_rotated_file_by_inode(self):
+        new_lines = ["4\n5\n", "6\n7\n"]
+        pygtail = Pygtail(self.logfile.name)
+        pygtail.read()
+        self.append(new_lines[0])
+        # an older generation under a name that would otherwise be preferred
+        with open("%s.1" % self.logfile.name, 'w') as fh:
+            fh.write("old\n")
+        an_hour_ago = time.time() - 3600
+        os.utime("%s.1" % self.logfile.name, (an_hour_ago, an_hour_ago))
+        os.rename(self.logfile.name, "%s-20160616" % self.logfile.name)
+        self.append(new_lines[1])
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(pygtail.read(), ''.join(new_lines))
+
+    def test_logrotate_several_generations(self):
+        new_lines = ["4\n5\n", "6\n7\n", "8\n9\n"]
+        pygtail = Pygtail(self.logfile.name)
+        pygtail.read()
+        self.append(new_lines[0])
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append(new_lines[1])
+        os.rename("%s.1" % self.logfile.name, "%s.2" % self.logfile.name)
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append(new_lines[2])
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(pygtail.read(), ''.join(new_lines))
+
+    def test_logrotate_several_generations_compressed(self):
+        new_lines = ["4\n5\n", "6\n7\n", "8\n9\n"]
+        pygtail = Pygtail(self.logfile.name)
+        pygtail.read()
+        self.append(new_lines[0])
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append(new_lines[1])
+        # compressed the way gzip(1) does it, keeping the modification time
+        rotated = "%s.1" % self.logfile.name
+        with open(rotated, 'rb') as src:
+            with gzip.open("%s.2.gz" % self.logfile.name, 'wb') as dst:
+                dst.write(src.read())
+        st = os.stat(rotated)
+        os.utime("%s.2.gz" % self.logfile.name, (st.st_atime, st.st_mtime))
+        os.remove(rotated)
+        os.rename(self.logfile.name, rotated)
+        self.append(new_lines[2])
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(pygtail.read(), ''.join(new_lines))
+
+    def test_logrotate_prefetched_generation_used(self):
+        opened = []
+        prefetcher_open = core._Prefetcher.open
+        core._Prefetcher.open = lambda prefetcher: opened.append(prefetcher_open(prefetcher)) or opened[-1]
+        self.addCleanup(setattr, core._Prefetcher, 'open', prefetcher_open)
+
+        new_lines = ["4\n5\n", "6\n7\n", "8\n9\n"]
+        Pygtail(self.logfile.name).read()
+        self.append(new_lines[0])
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append(new_lines[1])
+        os.rename("%s.1" % self.logfile.name, "%s.2" % self.logfile.name)
+        with open(self.logfile.name, 'rb') as src:
+            with gzip.open("%s.1.gz" % self.logfile.name, 'wb') as dst:
+                dst.write(src.read())
+        with open(self.logfile.name, 'w'):
+            pass
+        self.append(new_lines[2])
+        self.assertEqual(Pygtail(self.logfile.name).read(), ''.join(new_lines))
+        self.assertEqual(len(opened), 1)
+        self.assertIsNotNone(opened[0])
+
     def test_logrotate_with_dateext_without_delaycompress(self):
         new_lines = ["4\n5\n", "6\n7\n"]
         pygtail = Pygtail(self.logfile.name)
@@ -294,6 +515,39 @@ class PygtailTest(unittest.TestCase):
         for line in pygtail:
             previous_lines += 1
 
+    def test_checkpoint_bytes(self):
+        updates = []
+        pygtail = Pygtail(self.logfile.name, checkpoint_bytes=4,
+                          on_update=lambda: updates.append(pygtail.since_update))
+        pygtail.readlines()
+        # after the second line, and at the end of the file
+        self.assertEqual(updates, [2, 1])
+
+    def test_checkpoint_interval(self):
+        updates = [0]
+
+        def record_update():
+            updates[0] += 1
+
+        pygtail = Pygtail(self.logfile.name, checkpoint_interval=3600, on_update=record_update)
+        next(pygtail)
+        self.assertEqual(updates[0], 0)
+        pygtail.checkpoint_interval = 0.001
+        time.sleep(0.01)
+        next(pygtail)
+        self.assertEqual(updates[0], 1)
+
+    def test_corrupt_offset_file(self):
+        with open(self.logfile.name + ".offset", "w") as fh:
+            fh.write("12")
+        sys.stderr = captured = io.BytesIO() if PY2 else io.StringIO()
+        pygtail = Pygtail(self.logfile.name)
+        captured_value = captured.getvalue()
+        sys.stderr = sys.__stderr__
+        self.assertIn("corrupt offset file", captured_value)
+        self.assertEqual(pygtail.read(), self.test_str)
+        self.assertFalse(os.path.exists(self.logfile.name + ".offset.tmp"))
+
     def test_renamecreate(self):
         """
         Tests "renamecreate" semantics where the currently processed file gets renamed and the
@@ -405,6 +659,693 @@ class PygtailTest(unittest.TestCase):
             self.assertGreaterEqual(offsets[i], offsets[i])
             self.assertGreaterEqual(offsets[i+1], offsets[i])
 
+    def test_read_batches(self):
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(list(pygtail.read_batches()), [self.test_lines])
+        self.append("4\n5\n")
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(list(pygtail.read_batches()), [["4\n", "5\n"]])
+
+    def test_read_batches_small_blocks(self):
+        self.append("a longer line\n6\n")
+        pygtail = Pygtail(self.logfile.name)
+        batches = list(pygtail.read_batches(max_bytes=3, max_lines=1))
+        self.assertEqual(batches, [[line] for line in self.test_lines + ["a longer line\n", "6\n"]])
+        self.assertEqual(Pygtail(self.logfile.name).read(), None)
+
+    def test_read_batches_full_lines(self):
+        pygtail = Pygtail(self.logfile.name, full_lines=True)
+        self.append("4\n5,")
+        self.assertEqual(sum(pygtail.read_batches(max_bytes=4), []), self.test_lines + ["4\n"])
+        self.append("5.5\n6\n")
+        self.assertEqual(sum(pygtail.read_batches(), []), ["5,5.5\n", "6\n"])
+
+    def test_read_batches_every_n(self):
+        updates = [0]
+
+        def record_update():
+            updates[0] += 1
+
+        pygtail = Pygtail(self.logfile.name, every_n=2, on_update=record_update)
+        for batch in pygtail.read_batches(max_bytes=2):
+            self.assertEqual(len(batch), 1)
+        # once after the second line, once at the end
+        self.assertEqual(updates[0], 2)
+
+    def test_read_batches_logrotate(self):
+        new_lines = ["4\n5\n", "6\n7\n"]
+        pygtail = Pygtail(self.logfile.name)
+        pygtail.read()
+        self.append(new_lines[0])
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append(new_lines[1])
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual(''.join(sum(pygtail.read_batches(), [])), ''.join(new_lines))
+
+    @unittest.skipIf(futures is None, "needs concurrent.futures")
+    def test_map(self):
+        lines = ["%d\n" % i for i in range(1000)]
+        self.append(''.join(lines))
+        pygtail = Pygtail(self.logfile.name)
+        results = list(pygtail.map(len, workers=2, batch_size=7))
+        self.assertEqual(results, [len(line) for line in self.test_lines + lines])
+        self.assertEqual(Pygtail(self.logfile.name).read(), None)
+
+    @unittest.skipIf(futures is None, "needs concurrent.futures")
+    def test_map_commits_offset_after_results(self):
+        self.append(''.join("%d\n" % i for i in range(4, 100)))
+        pygtail = Pygtail(self.logfile.name)
+        results = pygtail.map(str.strip, workers=2, executor='thread', batch_size=5, max_bytes=20)
+        self.assertEqual([next(results) for _ in range(12)], [str(i) for i in range(1, 13)])
+        results.close()
+        # only blocks whose results were all yielded are marked as read
+        self.assertEqual(Pygtail(self.logfile.name).readlines()[0], "11\n")
+
+    def test_prefetch(self):
+        new_lines = ["4\n5\n", "6\n7\n"]
+        pygtail = Pygtail(self.logfile.name, prefetch=2)
+        self.assertEqual(pygtail.read(), self.test_str)
+        self.append(new_lines[0])
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append(new_lines[1])
+        self.assertEqual(pygtail.read(), ''.join(new_lines))
+
+    def test_prefetch_full_lines(self):
+        pygtail = Pygtail(self.logfile.name, prefetch=2, binary=True, full_lines=True)
+        pygtail.read()
+        self.append("4\n5")
+        self.assertEqual(pygtail.read(), b"4\n")
+        self.append("\n")
+        self.assertEqual(pygtail.read(), b"5\n")
+
+    def test_include_exclude(self):
+        self.append("GET /health 200\nGET /a 500\nGET /health 200\nPOST /b 200\n")
+        pygtail = Pygtail(self.logfile.name, include="^GET", exclude=re.compile("health"))
+        self.assertEqual(pygtail.readlines(), ["GET /a 500\n"])
+        self.append("GET /c 200\n")
+        self.assertEqual(Pygtail(self.logfile.name, include="^GET").read(), "GET /c 200\n")
+
+    def test_read_batches_exclude(self):
+        self.append("GET /health 200\n" * 50 + "GET /a 500\n")
+        pygtail = Pygtail(self.logfile.name, binary=True, exclude=r"health|^\d$")
+        self.assertEqual(list(pygtail.read_batches(max_bytes=100)), [[b"GET /a 500\n"]])
+        # filtered lines count as read
+        self.assertEqual(Pygtail(self.logfile.name).read(), None)
+
+    def test_filters_spanning_lines(self):
+        with open(self.logfile.name, 'w') as fh:
+            fh.write("foo\nbar x\nbaz\nqux foo\n")
+        for kwargs in [{'include': r'foo\s+bar'}, {'exclude': 'x\nb'}, {'include': r'[^x]+'}]:
+            by_line = Pygtail(self.logfile.name, save_on_end=False, **kwargs).readlines()
+            by_block = Pygtail(self.logfile.name, save_on_end=False, **kwargs).read_batches()
+            self.assertEqual([line for batch in by_block for line in batch], by_line)
+
+    def test_filters_anchored_to_line(self):
+        with open(self.logfile.name, 'w') as fh:
+            fh.write("foo\n\n  \nbar\n")
+        for kwargs, expected in [({'include': '^$'}, ["\n"]),
+                                 ({'exclude': r'^\s*$'}, ["foo\n", "bar\n"])]:
+            by_line = Pygtail(self.logfile.name, save_on_end=False, **kwargs).readlines()
+            self.assertEqual(by_line, expected)
+            by_block = Pygtail(self.logfile.name, save_on_end=False, **kwargs).read_batches()
+            self.assertEqual([line for batch in by_block for line in batch], expected)
+
+    def test_records(self):
+        traceback = "ERROR boom\nTraceback (most recent call last):\n  File \"x.py\"\nValueError\n"
+        self.append(traceback + "INFO ok\n")
+        pygtail = Pygtail(self.logfile.name)
+        records = list(pygtail.records(record_start=r"\d|[A-Z]+ ", flush_timeout=0, max_bytes=10))
+        self.assertEqual(records, self.test_lines + [traceback, "INFO ok\n"])
+
+    def test_records_incomplete(self):
+        self.append("ERROR boom\n  at a()\n")
+        pygtail = Pygtail(self.logfile.name, binary=True)
+        records = list(pygtail.records(continuation=r"\s", flush_timeout=None))
+        self.assertEqual(records, [b"1\n", b"2\n", b"3\n"])
+        # the unfinished record is picked up whole on the next run
+        self.append("  at b()\nINFO ok\n")
+        pygtail = Pygtail(self.logfile.name, binary=True)
+        records = list(pygtail.records(continuation=r"\s", flush_timeout=None))
+        self.assertEqual(records, [b"ERROR boom\n  at a()\n  at b()\n"])
+
+    def test_records_incomplete_not_counted(self):
+        record = "ERROR boom\n  at a()\n  at b()\n  at c()\n  at d()\n"
+        with open(self.logfile.name, 'w') as fh:
+            fh.write(record)
+        pygtail = Pygtail(self.logfile.name, every_n=3)
+        for _ in range(2):
+            self.assertEqual(list(pygtail.records(continuation=r"\s", flush_timeout=None,
+                                                  max_bytes=16)), [])
+        self.assertEqual(pygtail.stats()['lines_read'], 0)
+        self.assertEqual(Pygtail(self.logfile.name).read(), record)
+
+    def test_records_stopped_early(self):
+        self.append("ERROR boom\n  at a()\nINFO ok\n")
+        pygtail = Pygtail(self.logfile.name)
+        records = pygtail.records(continuation=r"\s", flush_timeout=0)
+        self.assertEqual(next(records), "1\n")
+        records.close()
+        # the records not yet yielded are left for the next call
+        records = pygtail.records(continuation=r"\s", flush_timeout=0)
+        self.assertEqual(next(records), "2\n")
+        # or for whatever else reads meanwhile
+        self.assertEqual(next(pygtail), "3\n")
+        self.assertEqual(list(records), ["ERROR boom\n  at a()\n", "INFO ok\n"])
+        self.assertEqual(pygtail.stats()['lines_read'], 6)
+
+        self.append("4\n5\n")
+        pygtail = Pygtail(self.logfile.name)
+        records = pygtail.records(continuation=r"\s", flush_timeout=0)
+        self.assertEqual(next(records), "4\n")
+        pygtail.update_offset_file()
+        self.assertEqual(Pygtail(self.logfile.name).read(), "5\n")
+
+    def test_records_max_record_bytes(self):
+        self.append("ERROR boom\n" + "  at a()\n" * 10)
+        pygtail = Pygtail(self.logfile.name)
+        records = list(pygtail.records(continuation=r"\s", max_record_bytes=40, flush_timeout=0,
+                                       max_bytes=16))
+        self.assertEqual(''.join(records), self.test_str + "ERROR boom\n" + "  at a()\n" * 10)
+        self.assertTrue(all(len(record) < 60 for record in records))
+
+    def test_column_batches_regex(self):
+        self.append('10.0.0.1 "GET /" 200\nnot a request\n10.0.0.2 "GET /x" 404\n')
+        extractor = RegexExtractor(r'(?P<ip>\S+) "(?P<request>[^"]*)" (?P<status>\d+)',
+                                   types={'status': int})
+        pygtail = Pygtail(self.logfile.name)
+        batches = list(pygtail.column_batches(extractor))
+        self.assertEqual(len(batches), 1)
+        batch = batches[0]
+        self.assertEqual(batch.columns['ip'], ['10.0.0.1', '10.0.0.2'])
+        self.assertEqual(batch.columns['request'], ['GET /', 'GET /x'])
+        self.assertEqual(list(batch.columns['status']), [200, 404])
+        self.assertEqual(list(batch.rows), [6, 41])
+        self.assertEqual(batch.errors, 4)
+        self.assertEqual(batch.offset.offset, os.path.getsize(self.logfile.name))
+        self.assertEqual(list(Pygtail(self.logfile.name).column_batches(extractor)), [])
+
+    def test_column_batches_regex_within_lines(self):
+        with open(self.logfile.name, 'w') as fh:
+            fh.write("foo\nbar baz\nqux\n")
+        extractor = RegexExtractor(r'(?P<a>\w+)\s+(?P<b>\w+)')
+        batch, = Pygtail(self.logfile.name).column_batches(extractor)
+        self.assertEqual(batch.columns, {'a': ['bar'], 'b': ['baz']})
+        self.assertEqual(list(batch.rows), [4])
+        self.assertEqual(batch.errors, 2)
+
+        # an empty match after the last newline isn't a row of its own
+        batch = RegexExtractor(r'(?P<n>\d*)').extract(b'12\nab\n7\n')
+        self.assertEqual(batch.columns, {'n': [b'12', b'', b'7']})
+        self.assertEqual(list(batch.rows), [0, 3, 6])
+        self.assertEqual(batch.errors, 0)
+
+    def test_column_batches_json_lines(self):
+        with open(self.logfile.name, 'w') as fh:
+            fh.write('{"level": "info", "ms": 1.5}\n{"level": "error"}\n')
+        extractor = JSONLinesExtractor(['level', 'ms'])
+        batch, = Pygtail(self.logfile.name).column_batches(extractor)
+        self.assertEqual(batch.columns, {'level': ['info', 'error'], 'ms': [1.5, None]})
+        self.assertEqual(batch.errors, 0)
+
+        self.append('oops\n{"level": "warn", "ms": 2}\n')
+        extractor = JSONLinesExtractor(['level', 'ms'], types={'ms': float})
+        batch, = Pygtail(self.logfile.name).column_batches(extractor)
+        self.assertEqual(batch.columns['level'], ['warn'])
+        self.assertEqual(list(batch.columns['ms']), [2.0])
+        self.assertEqual(list(batch.rows), [5])
+        self.assertEqual(batch.errors, 1)
+
+        # one line holding two objects is an error, not two rows
+        self.append('{"level": "a"},{"level": "b"}\n')
+        batch, = Pygtail(self.logfile.name).column_batches(extractor)
+        self.assertEqual(batch.columns['level'], [])
+        self.assertEqual(batch.errors, 1)
+
+        # nor do two broken lines make up one object between them
+        batch = extractor.extract(b'{"level": [1\n2]},{"level": "c"}\n')
+        self.assertEqual(batch.columns['level'], [])
+        self.assertEqual(batch.errors, 2)
+
+    def test_stats(self):
+        pygtail = Pygtail(self.logfile.name, exclude="2")
+        self.assertEqual(pygtail.read(), "1\n3\n")
+        stats = pygtail.stats()
+        self.assertEqual((stats['lines_read'], stats['bytes_read'], stats['lines_skipped']), (3, 6, 1))
+        self.assertEqual((stats['files_opened'], stats['offset_writes'], stats['rotations']), (1, 1, 0))
+        self.assertEqual(stats['read_seconds'], 0)
+
+        self.append("4\n")
+        self.copytruncate()
+        self.append("5\n6\n")
+        events = []
+        pygtail = Pygtail(self.logfile.name, timing=lambda event, seconds: events.append(event))
+        self.assertEqual([len(lines) for lines in pygtail.read_batches()], [1, 2])
+        stats = pygtail.stats()
+        self.assertEqual((stats['lines_read'], stats['files_opened'], stats['rotations']), (3, 2, 1))
+        self.assertTrue(stats['rotation_probes'] >= 1)
+        self.assertEqual(set(events), set(['read', 'checkpoint', 'rotation_probe']))
+        self.assertTrue(stats['read_seconds'] > 0)
+
+    def test_pending_bytes_and_lag(self):
+        pygtail = Pygtail(self.logfile.name)
+        self.assertEqual((pygtail.pending_bytes(), pygtail.lag()), (6, None))
+        pygtail.read()
+        self.assertEqual((pygtail.pending_bytes(), pygtail.lag()), (0, 0))
+        self.append("4\n")
+        self.assertEqual(pygtail.pending_bytes(), 2)
+        self.assertTrue(pygtail.lag() >= 0)
+
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append("5\n6\n")
+        # the rest of the old file, then the new one
+        self.assertEqual(pygtail.pending_bytes(), 6)
+        self.assertEqual(Pygtail(self.logfile.name).pending_bytes(), 6)
+        self.assertEqual(pygtail.read(), "4\n5\n6\n")
+        self.assertEqual(pygtail.pending_bytes(), 0)
+
+    def test_status(self):
+        Pygtail(self.logfile.name).read()
+        self.append("4\n")
+        self.copytruncate()
+        self.append("5\n")
+        offset_file = "%s.offset" % self.logfile.name
+        with open(offset_file) as fh:
+            saved = fh.read()
+        rows = _status([self.logfile.name, self.logfile.name + "*", "/nonexistent.log"])
+        for row in rows[:2]:
+            self.assertEqual((row['file'], row['pending_bytes'], row['pending_files']),
+                             (self.logfile.name, 4, 2))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[2]['file'], "%s.1" % self.logfile.name)
+        self.assertEqual(rows[3]['error'], "no such file")
+        # nothing was read or saved
+        with open(offset_file) as fh:
+            self.assertEqual(fh.read(), saved)
+
+    def test_start_lines(self):
+        self.append(''.join("%d\n" % i for i in range(4, 100000)))
+        pygtail = Pygtail(self.logfile.name, start_lines=3)
+        self.assertEqual(pygtail.read(), "99997\n99998\n99999\n")
+        # only applies when there is no offset yet
+        self.append("100000\n")
+        self.assertEqual(Pygtail(self.logfile.name, start_lines=3).read(), "100000\n")
+
+    def test_start_lines_partial_and_short(self):
+        self.append("4")
+        self.assertEqual(Pygtail(self.logfile.name, start_lines=2, binary=True).read(), b"3\n4")
+        os.remove("%s.offset" % self.logfile.name)
+        self.assertEqual(Pygtail(self.logfile.name, start_lines=10).read(), "1\n2\n3\n4")
+        os.remove("%s.offset" % self.logfile.name)
+        self.assertEqual(Pygtail(self.logfile.name, start_lines=0).read(), None)
+
+    def test_find_last_lines_block_boundaries(self):
+        data = b"a\nbb\n\nccc\n"
+        for block_size in (1, 2, 3, 64):
+            for n, expected in enumerate([b"", b"ccc\n", b"\nccc\n", b"bb\n\nccc\n", data, data]):
+                self.assertEqual(data[_find_last_lines(io.BytesIO(data), len(data), n, block_size):],
+                                 expected)
+
+    def test_start_lines_gzip(self):
+        gzipped = "%s.gz" % self.logfile.name
+        self.addCleanup(lambda: [os.remove(f) for f in glob.glob(gzipped + "*")])
+        with gzip.open(gzipped, 'wb') as fh:
+            fh.write(''.join("%d\n" % i for i in range(1000)).encode('ascii'))
+        self.assertEqual(Pygtail(gzipped, start_lines=2).read(), "998\n999\n")
+
+    def _timestamped(self, start, count):
+        return ["%s line %d\n" % ((start + datetime.timedelta(minutes=i)).isoformat(), i)
+                for i in range(count)]
+
+    def test_since(self):
+        start = datetime.datetime(2024, 5, 1, 12, 0)
+        lines = self._timestamped(start, 1000)
+        lines[500:500] = ["  continued\n"]
+        with open(self.logfile.name, 'w') as fh:
+            fh.writelines(lines)
+        pygtail = Pygtail(self.logfile.name, since=start + datetime.timedelta(minutes=997, seconds=1))
+        self.assertEqual(pygtail.readlines(), lines[-2:])
+        # a continuation line goes with the line before
+        since = start + datetime.timedelta(minutes=499, seconds=30)
+        self.assertEqual(Pygtail(self.logfile.name, offset_file=self.logfile.name + ".offset2",
+                                 since=since).readlines()[0], lines[501])
+        os.remove(self.logfile.name + ".offset2")
+        # later, the offset is used as usual
+        self.append("more\n")
+        self.assertEqual(Pygtail(self.logfile.name, since=start).read(), "more\n")
+
+    def test_since_rotated(self):
+        start = datetime.datetime(2024, 5, 1, 12, 0)
+        old, new = self._timestamped(start, 100), self._timestamped(start + datetime.timedelta(hours=2), 100)
+        with open("%s.1" % self.logfile.name, 'w') as fh:
+            fh.writelines(old)
+        with open(self.logfile.name, 'w') as fh:
+            fh.writelines(new)
+        mtime = time.mktime((start + datetime.timedelta(minutes=99)).timetuple())
+        os.utime("%s.1" % self.logfile.name, (mtime, mtime))
+
+        since = start + datetime.timedelta(minutes=98)
+        self.assertEqual(Pygtail(self.logfile.name, since=since).readlines(), old[98:] + new)
+        os.remove("%s.offset" % self.logfile.name)
+        since = start + datetime.timedelta(minutes=150)
+        self.assertEqual(Pygtail(self.logfile.name, since=since).readlines(), new[30:])
+
+    def test_since_timestamp_regex(self):
+        with open(self.logfile.name, 'w') as fh:
+            fh.write("a 01/05/24 10:00\nb 01/05/24 11:00\nc 01/05/24 12:00\n")
+        parser = regex_timestamp_parser(r"(\S+ \d\d:\d\d)$", "%d/%m/%y %H:%M")
+        pygtail = Pygtail(self.logfile.name, since=datetime.datetime(2024, 5, 1, 10, 30),
+                          timestamp_parser=parser)
+        self.assertEqual(pygtail.read(), "b 01/05/24 11:00\nc 01/05/24 12:00\n")
+
+    def copy_to_fd(self, pygtail):
+        with tempfile.TemporaryFile() as out:
+            copied = pygtail._copy_to_fd(out.fileno())
+            out.seek(0)
+            data = out.read()
+        self.assertEqual(copied, len(data))
+        return data.decode('utf-8')
+
+    def test_copy_to_fd(self):
+        self.assertEqual(self.copy_to_fd(Pygtail(self.logfile.name)), self.test_str)
+        self.append("4\n5")
+        self.assertEqual(self.copy_to_fd(Pygtail(self.logfile.name)), "4\n5")
+        self.assertEqual(self.copy_to_fd(Pygtail(self.logfile.name)), "")
+
+    def test_copy_to_fd_logrotate_compressed(self):
+        Pygtail(self.logfile.name).read()
+        self.append("4\n5\n")
+        with open(self.logfile.name, 'rb') as src:
+            with gzip.open("%s.1.gz" % self.logfile.name, 'wb') as dst:
+                dst.write(src.read())
+        with open(self.logfile.name, 'w'):
+            pass
+        self.append("6\n7\n")
+        self.assertEqual(self.copy_to_fd(Pygtail(self.logfile.name)), "4\n5\n6\n7\n")
+        self.assertEqual(Pygtail(self.logfile.name).read(), None)
+
+    def test_range_copier_fallback(self):
+        read_fd, write_fd = os.pipe()
+        try:
+            copier = _RangeCopier(write_fd)
+            # as if neither sendfile nor splice were available
+            copier._methods = copier._methods[-1:]
+            with open(self.logfile.name, 'rb') as fh:
+                self.assertEqual(copier.copy(fh.fileno(), 2, 100), 4)
+            self.assertEqual(os.read(read_fd, 100), b"2\n3\n")
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_binary(self):
+        with open(self.logfile.name, "ab") as fh:
+            fh.write(b"caf\xe9\r\n")
+        pygtail = Pygtail(self.logfile.name, binary=True)
+        self.assertEqual(pygtail.readlines(), [b"1\n", b"2\n", b"3\n", b"caf\xe9\r\n"])
+        self.append("4\n")
+        pygtail = Pygtail(self.logfile.name, binary=True)
+        self.assertEqual(pygtail.read(), b"4\n")
+
+    def test_binary_logrotate_without_delay_compress(self):
+        pygtail = Pygtail(self.logfile.name, binary=True)
+        pygtail.read()
+        self.append("4\n5\n")
+        gzip_handle = gzip.open("%s.1.gz" % self.logfile.name, 'wb')
+        with open(self.logfile.name, 'rb') as logfile:
+            gzip_handle.write(logfile.read())
+        gzip_handle.close()
+        with open(self.logfile.name, 'w'):
+            pass
+        self.append("6\n")
+        pygtail = Pygtail(self.logfile.name, binary=True)
+        self.assertEqual(pygtail.readlines(), [b"4\n", b"5\n", b"6\n"])
+
+    def test_read_batches_decode(self):
+        with io.open(self.logfile.name, "a", encoding="utf-8") as fh:
+            fh.write(u"\u00e9t\u00e9\n")
+        pygtail = Pygtail(self.logfile.name, binary=True, encoding="utf-8")
+        batches = list(pygtail.read_batches(max_bytes=7, decode=True))
+        self.assertEqual(sum(batches, []), [u"1\n", u"2\n", u"3\n", u"\u00e9t\u00e9\n"])
+
+    def test_mmap(self):
+        pygtail = Pygtail(self.logfile.name, binary=True, use_mmap=True, full_lines=True)
+        self.assertEqual(pygtail.readlines(), [b"1\n", b"2\n", b"3\n"])
+        # the mapping is extended as the file grows
+        self.append("4\n5")
+        self.assertEqual(pygtail.readlines(), [b"4\n"])
+        self.append("\n6\n")
+        self.assertEqual(list(pygtail.read_batches(max_bytes=2)), [[b"5\n"], [b"6\n"]])
+        self.assertEqual(Pygtail(self.logfile.name, binary=True, use_mmap=True).read(), None)
+
+    def test_mmap_logrotate_with_delay_compress(self):
+        new_lines = [b"4\n5\n", b"6\n7\n"]
+        pygtail = Pygtail(self.logfile.name, binary=True, use_mmap=True)
+        pygtail.read()
+        self.append(new_lines[0].decode())
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append(new_lines[1].decode())
+        pygtail = Pygtail(self.logfile.name, binary=True, use_mmap=True)
+        self.assertEqual(pygtail.read(), b''.join(new_lines))
+
+    def test_mmap_requires_binary(self):
+        self.assertRaises(ValueError, Pygtail, self.logfile.name, use_mmap=True)
+
+    def test_binary_iterator_with_offsets(self):
+        pygtail = Pygtail(self.logfile.name, binary=True, save_on_end=False)
+        log_inode = os.stat(self.logfile.name).st_ino
+        offsets = [offset for _, offset in pygtail.with_offsets()]
+        self.assertEqual([offset.offset for offset in offsets], [2, 4, 6])
+        self.assertEqual(set(offset.inode for offset in offsets), set([log_inode]))
+        self.assertFalse(hasattr(offsets[0], '__dict__'))
+
+    def test_batches_with_offsets(self):
+        self.append("4\n5\n")
+        pygtail = Pygtail(self.logfile.name, save_on_end=False)
+        batches = list(pygtail.batches_with_offsets(max_bytes=4))
+        self.assertEqual([lines for lines, _ in batches], [["1\n", "2\n"], ["3\n", "4\n"], ["5\n"]])
+        self.assertEqual([offset.offset for _, offset in batches], [4, 8, 10])
+        pygtail.write_offset_to_file(batches[0][1])
+        self.assertEqual(Pygtail(self.logfile.name).read(), "3\n4\n5\n")
+
+    def test_follow(self):
+        pygtail = Pygtail(self.logfile.name, follow=True)
+        self.assertEqual([next(pygtail) for _ in range(3)], self.test_lines)
+        self.later(self.append, "4\n")
+        self.assertEqual(next(pygtail), "4\n")
+        with open(self.logfile.name + '.offset', 'r') as f:
+            self.assertEqual(int(f.readlines()[1]), 6)
+
+    def test_follow_polling(self):
+        pygtail = Pygtail(self.logfile.name, follow=True, binary=True)
+        pygtail._watcher = _PollWatcher(self.logfile.name)
+        batches = pygtail.read_batches()
+        self.assertEqual(next(batches), [b"1\n", b"2\n", b"3\n"])
+        self.later(self.append, "4\n5\n")
+        self.assertEqual(next(batches), [b"4\n", b"5\n"])
+
+    def test_follow_logrotate(self):
+        def rotate():
+            self.append("4\n")
+            os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+            self.append("5\n")
+
+        pygtail = Pygtail(self.logfile.name, follow=True)
+        self.assertEqual(next(pygtail.read_batches()), self.test_lines)
+        self.later(rotate)
+        self.assertEqual([next(pygtail), next(pygtail)], ["4\n", "5\n"])
+
+    def test_follow_copytruncate(self):
+        def rotate():
+            self.append("4\n")
+            self.copytruncate()
+            self.append("5\n")
+
+        pygtail = Pygtail(self.logfile.name, follow=True)
+        self.assertEqual(next(pygtail.read_batches()), self.test_lines)
+        self.later(rotate)
+        self.assertEqual([next(pygtail), next(pygtail)], ["4\n", "5\n"])
+
+    @unittest.skipIf(sys.version_info < (3, 6), "requires Python 3.6+")
+    def test_async(self):
+        from pygtail import AsyncPygtail
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        tail = AsyncPygtail(self.logfile.name, paranoid=True)
+        lines = [loop.run_until_complete(tail.__anext__()) for _ in range(3)]
+        self.assertEqual(lines, self.test_lines)
+        self.assertRaises(StopAsyncIteration, loop.run_until_complete, tail.__anext__())
+        with open(self.logfile.name + '.offset', 'r') as f:
+            self.assertEqual(int(f.readlines()[1]), 6)
+
+    @unittest.skipIf(sys.version_info < (3, 6), "requires Python 3.6+")
+    def test_async_follow_batches(self):
+        from pygtail import AsyncPygtail
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        tail = AsyncPygtail(self.logfile.name, follow=True, binary=True)
+        self.addCleanup(tail.close)
+        batches = tail.batches()
+        self.assertEqual(loop.run_until_complete(batches.__anext__()), [b"1\n", b"2\n", b"3\n"])
+        self.later(self.append, "4\n")
+        self.assertEqual(loop.run_until_complete(batches.__anext__()), [b"4\n"])
+
+    def test_close_and_reopen_after_rotation(self):
+        pygtail = Pygtail(self.logfile.name, save_on_end=False)
+        self.assertEqual(next(pygtail), "1\n")
+        pygtail.close()
+        os.rename(self.logfile.name, "%s.1" % self.logfile.name)
+        self.append("4\n")
+        self.assertEqual(pygtail.readlines(), ["2\n", "3\n", "4\n"])
+
+    def _test_offset_store(self, open_store):
+        store = open_store()
+        self.assertEqual(Pygtail(self.logfile.name, offset_store=store).read(), self.test_str)
+        self.assertFalse(os.path.exists(self.logfile.name + ".offset"))
+        self.append("4\n")
+        store.close()
+        store = open_store()
+        self.assertEqual(Pygtail(self.logfile.name, offset_store=store).read(), "4\n")
+        self.assertEqual(store.load(os.path.abspath(self.logfile.name)),
+                         (os.stat(self.logfile.name).st_ino, 8))
+        store.close()
+        store = open_store()
+        saved_at = store.saved_at(os.path.abspath(self.logfile.name))
+        self.assertLess(abs(time.time() - saved_at), 60)
+        self.assertIsNotNone(Pygtail(self.logfile.name, offset_store=store).lag())
+        store.close()
+
+    def test_journal_offset_store(self):
+        journal = self.logfile.name + ".journal"
+        self.addCleanup(os.remove, journal)
+        self._test_offset_store(lambda: JournalOffsetStore(journal))
+
+    def test_journal_offset_store_compaction(self):
+        journal = self.logfile.name + ".journal"
+        self.addCleanup(os.remove, journal)
+        store = JournalOffsetStore(journal, compact_min=4)
+        for offset in range(10):
+            store.save("a key", 1, offset)
+        store.save("b", 2, 0)
+        store.close()
+        with open(journal, "a") as fh:
+            # written before save times were recorded
+            fh.write("4 5 @old key\n")
+            fh.write("3 7 torn")
+        store = JournalOffsetStore(journal)
+        self.assertEqual(store.load("@old key"), (4, 5))
+        self.assertEqual(store.saved_at("@old key"), None)
+        self.assertIsNotNone(store.saved_at("a key"))
+        self.assertEqual(store.load("a key"), (1, 9))
+        self.assertEqual(store.load("b"), (2, 0))
+        self.assertEqual(store.load("torn"), None)
+        self.assertLess(store._records, 11)
+
+    def test_journal_offset_store_durable(self):
+        journal = self.logfile.name + ".journal"
+        self.addCleanup(os.remove, journal)
+        syncs = []
+        fsync = offsets.os.fsync
+        offsets.os.fsync = lambda fd: syncs.append(fd) or fsync(fd)
+        self.addCleanup(setattr, offsets.os, 'fsync', fsync)
+        store = JournalOffsetStore(journal)
+        store.save("a", 1, 2)
+        self.assertEqual(len(syncs), 1)
+        with store.batch():
+            store.save("a", 1, 3)
+            store.save("b", 1, 4)
+            self.assertEqual(len(syncs), 1)
+        self.assertEqual(len(syncs), 2)
+        store.close()
+        self.assertEqual(len(syncs), 2)
+
+    def test_sqlite_offset_store(self):
+        db = self.logfile.name + ".db"
+        self.addCleanup(lambda: [os.remove(f) for f in glob.glob(db + "*")])
+        self._test_offset_store(lambda: SQLiteOffsetStore(db))
+
+
+class PygtailGroupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def append(self, name, str):
+        with open(os.path.join(self.dir, name), "a") as fh:
+            fh.write(str)
+
+    def read(self, group):
+        return sorted((os.path.basename(filename), line) for filename, line in group)
+
+    def test_group(self):
+        self.append("a.log", "a1\na2\n")
+        self.append("b.log", "b1\n")
+        group = PygtailGroup([os.path.join(self.dir, "*.log")])
+        self.assertEqual(self.read(group), [("a.log", "a1\n"), ("a.log", "a2\n"), ("b.log", "b1\n")])
+        self.assertEqual(self.read(group), [])
+        self.append("b.log", "b2\n")
+        self.append("c.log", "c1\n")
+        self.assertEqual(self.read(group), [("b.log", "b2\n"), ("c.log", "c1\n")])
+        # offsets are saved as usual
+        self.assertEqual(self.read(PygtailGroup(os.path.join(self.dir, "*.log"))), [])
+
+    def test_group_shared_offset_store(self):
+        self.append("a.log", "a1\n")
+        self.append("b.log", "b1\n")
+        db = os.path.join(self.dir, "offsets.db")
+        store = SQLiteOffsetStore(db)
+        group = PygtailGroup(os.path.join(self.dir, "*.log"), offset_store=store)
+        self.assertEqual(len(self.read(group)), 2)
+        self.assertEqual(os.listdir(self.dir).count("a.log.offset"), 0)
+        self.append("a.log", "a2\n")
+        group = PygtailGroup(os.path.join(self.dir, "*.log"), offset_store=SQLiteOffsetStore(db))
+        self.assertEqual(self.read(group), [("a.log", "a2\n")])
+
+    def test_group_fair_batches(self):
+        self.append("a.log", "a\n" * 4)
+        self.append("b.log", "b\n" * 2)
+        group = PygtailGroup(os.path.join(self.dir, "*.log"), max_bytes=2)
+        order = [(os.path.basename(filename), len(lines)) for filename, lines in group.read_batches()]
+        self.assertEqual(order, [("a.log", 1), ("b.log", 1), ("a.log", 1), ("b.log", 1), ("a.log", 1), ("a.log", 1)])
+
+    def test_group_max_open(self):
+        for name in "abc":
+            self.append(name + ".log", name + "1\n")
+        group = PygtailGroup(os.path.join(self.dir, "*.log"), max_open=1, save_on_end=False)
+        self.assertEqual(len(self.read(group)), 3)
+        self.assertEqual(len(group._open), 1)
+        os.rename(os.path.join(self.dir, "a.log"), os.path.join(self.dir, "a.log.1"))
+        self.append("a.log.1", "a2\n")
+        self.append("a.log", "a3\n")
+        self.append("b.log", "b2\n")
+        self.assertEqual(self.read(group), [("a.log", "a2\n"), ("a.log", "a3\n"), ("b.log", "b2\n")])
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_generate_and_rotate(self):
+        dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dir)
+        path = os.path.join(dir, "bench.log")
+        lines, size = generate_log(path, 10000, line_length=50, distribution='lognormal')
+        self.assertEqual(os.path.getsize(path), size)
+        with open(path) as fh:
+            self.assertEqual(len(fh.readlines()), lines)
+        rotate(path, 'gzip')
+        self.assertEqual(os.path.getsize(path), 0)
+        with gzip.open(path + ".1.gz", 'rb') as fh:
+            self.assertEqual(len(fh.read()), size)
+
+    def test_run_benchmarks(self):
+        report = run_benchmarks(['read', 'copytruncate'], size=20000)
+        self.assertEqual(list(report['results']), ['read', 'copytruncate'])
+        read, copytruncate = report['results']['read'], report['results']['copytruncate']
+        self.assertTrue(20000 <= read['bytes'] < 21000)
+        self.assertTrue(read['lines'] > 0 and read['peak_rss_bytes'] > 0)
+        # half is read before rotating
+        self.assertTrue(10000 <= copytruncate['bytes'] < 11000)
+        self.assertEqual(json.loads(json.dumps(report))['settings']['size'], 20000)
+
+
 def main():
     unittest.main(buffer=True)
 
@@ -18,7 +18,7 @@ def main():
         author_email = 'brad@footle.org',
         keywords = ['logging', 'tail', 'logtail2'],
         url = 'http://github.com/bgreenlee/pygtail',
-        packages = ['pygtail'],
+        packages = ['pygtail', 'pygtail.benchmarks'],
         entry_points = {
             'console_scripts': ['pygtail=pygtail.core:main']
             },